@@ -2,26 +2,33 @@
 Some of the functions check the data entered in the database for errors or incongruities.
 """
 
+import pandas as _pd
 from leiap.io import *
 
 
 ###############################################################################
 
 
-def check_all():
+def check_all(dataset=None):
     """Run all check functions with some basic parameters
+
+    Parameters
+    ----------
+    dataset : LeiapDataset, optional
+        Check the data of a dataset from `load_dataset()` instead of querying the database
     
     Returns
     -------
     checks : dict of pandas DataFrames
     """
     checks = dict()
-    checks["coords"] = check_coords_in_municipi()
+    with memoize():  # the checks load the same artifacts several times
+        checks["coords"] = check_coords_in_municipi(dataset=dataset)
 
-    checks["handmade"] = check_handmade()
+        checks["handmade"] = check_handmade(dataset=dataset)
 
-    for measure in ["Length", "Width", "Thickness", "Weight"]:
-        checks[measure] = check_measurement(measure, 3)
+        for measure in ["Length", "Width", "Thickness", "Weight"]:
+            checks[measure] = check_measurement(measure, 3, dataset=dataset)
 
     return checks
 
@@ -29,9 +36,14 @@ def check_all():
 ###############################################################################
 
 
-def check_coords_in_municipi():
+def check_coords_in_municipi(dataset=None):
     """Detect Eastings or Northings that do not lie within Son Servera
 
+    Parameters
+    ----------
+    dataset : LeiapDataset, optional
+        Check the points of a dataset from `load_dataset()` instead of querying the database
+
     Returns
     -------
     bad_coords : pandas DataFrame
@@ -41,7 +53,7 @@ def check_coords_in_municipi():
     min_easting, max_easting = 527509.3825000008, 537483.8490000003
     min_northing, max_northing = 4383439.635000001, 4391457.568000001
 
-    points = get_points()
+    points = get_points() if dataset is None else dataset.points
     bad_coords = points[
         (points["Easting"] <= min_easting)
         | (points["Easting"] >= max_easting)
@@ -59,18 +71,30 @@ def check_coords_in_municipi():
 ###############################################################################
 
 
-def check_handmade():
+def check_handmade(dataset=None):
     """Find any indigenous sherds that are not marked as handmade
 
+    Parameters
+    ----------
+    dataset : LeiapDataset, optional
+        Check the artifacts of a dataset from `load_dataset()` instead of querying the database; they must include the
+        'classify' section
+
     Returns
     -------
     flagged : pandas DataFrame
         A DataFrame of indigenous sherds that are not marked as handmade
     """
-    artifacts = get_artifacts(sections=["classify"])
-
     # types that are always handmade (hecho a mano)
     amano_types = ["Bronze Age pottery", "Talaiotic pottery", "Post-talaiotic pottery"]
+
+    if dataset is None:
+        query = LeiapQuery().productions(*amano_types)
+        artifacts = query.artifacts(sections=["classify"])
+    else:
+        dataset.require_sections(["classify"])
+        artifacts = dataset.artifacts
+
     flagged = artifacts[
         (artifacts["FabricTypeName"].isin(amano_types))
         & (artifacts["ManufactureMethod"] != 1)
@@ -89,7 +113,35 @@ def check_handmade():
 ###############################################################################
 
 
-def check_measurement(measure, sd):
+def _streaming_mean_std(chunks):
+    """Mean and sample standard deviation of a stream of Series, ignoring NaN
+
+    Chunk statistics are merged with the parallel algorithm of Chan et al. so that only one chunk is in memory at a
+    time.
+    """
+    n, mean, m2 = 0, 0.0, 0.0
+    for chunk in chunks:
+        chunk = chunk.dropna()
+        n_b = len(chunk)
+        if n_b == 0:
+            continue
+        mean_b = chunk.mean()
+        m2_b = ((chunk - mean_b) ** 2).sum()
+        delta = mean_b - mean
+        total = n + n_b
+        mean += delta * n_b / total
+        m2 += m2_b + delta ** 2 * n * n_b / total
+        n = total
+    if n == 0:
+        return float("nan"), float("nan")
+    std = (m2 / (n - 1)) ** 0.5 if n > 1 else float("nan")
+    return mean, std
+
+
+###############################################################################
+
+
+def check_measurement(measure, sd, chunksize=None, dataset=None):
     """Detect outliers
     
     Parameters
@@ -98,6 +150,12 @@ def check_measurement(measure, sd):
         Measurement column to check
     sd : number
         Cutoff point; number of standard deviations from the mean
+    chunksize : int, optional
+        If given, stream the artifacts in chunks of this many rows instead of loading them all at once. The table is
+        read twice: once for the mean and standard deviation, and once to collect the outliers.
+    dataset : LeiapDataset, optional
+        Check the artifacts of a dataset from `load_dataset()` instead of querying the database; they must include the
+        'metrics' section (and 'classify', to leave out discards, if it was loaded with them). `chunksize` is ignored.
     
     Returns
     -------
@@ -106,11 +164,33 @@ def check_measurement(measure, sd):
     """
     from numpy import abs
 
-    df = get_artifacts(sections=["metrics"])
-    outliers = df[
-        ~(abs(df[measure] - df[measure].mean()) <= (sd * df[measure].std()))
-        & ~(df[measure].isna())
-    ].sort_values(measure, ascending=False)
+    if dataset is not None or chunksize is None:
+        if dataset is None:
+            df = get_artifacts(sections=["metrics"])
+        else:
+            dataset.require_sections(["metrics"])
+            df = dataset.kept_artifacts()
+        mean, std = df[measure].mean(), df[measure].std()
+        outliers = df[
+            ~(abs(df[measure] - mean) <= (sd * std)) & ~(df[measure].isna())
+        ]
+    else:
+        mean, std = _streaming_mean_std(
+            chunk[measure]
+            for chunk in get_artifacts_chunks(sections=["metrics"], chunksize=chunksize)
+        )
+        outliers = _pd.concat(
+            [
+                chunk[
+                    ~(abs(chunk[measure] - mean) <= (sd * std))
+                    & ~(chunk[measure].isna())
+                ]
+                for chunk in get_artifacts_chunks(
+                    sections=["metrics"], chunksize=chunksize
+                )
+            ]
+        )
+    outliers = outliers.sort_values(measure, ascending=False)
     n = outliers.shape[0]
     if n > 0:
         print(
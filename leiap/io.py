@@ -2,7 +2,12 @@
 This file contains functions related to I/O from the database
 """
 
+import os as _os
 import pandas as _pd
+import threading as _threading
+import time as _time
+from collections import OrderedDict as _OrderedDict, deque as _deque
+from contextlib import contextmanager as _contextmanager
 from leiap.time import *
 
 
@@ -48,6 +53,14 @@ def connect2db(driver="{ODBC Driver 17 for SQL Server}", **kwargs):
     connection : MS SQL database connection
     """
     import pyodbc
+
+    connection = pyodbc.connect(_connection_string(driver, **kwargs))
+
+    return connection
+
+
+def _connection_string(driver="{ODBC Driver 17 for SQL Server}", **kwargs):
+    """Build the ODBC connection string for the SQL Server database"""
     from sys import platform
 
     if platform == "darwin" or platform == "linux" or platform == "linux2":
@@ -57,7 +70,7 @@ def connect2db(driver="{ODBC Driver 17 for SQL Server}", **kwargs):
 
     credentials = get_credentials(**kwargs)
 
-    connection = pyodbc.connect(
+    return (
         "DRIVER="
         + driver
         + ";SERVER="
@@ -70,294 +83,2856 @@ def connect2db(driver="{ODBC Driver 17 for SQL Server}", **kwargs):
         + credentials["database"]["password"]
     )
 
-    return connection
+
+#######################################################################################################################
+
+
+class _SQLServerBackend:
+    """The central SQL Server database, reached through pyodbc with the credentials file"""
+
+    name = "mssql"
+    path = None
+
+    def connect(self, **kwargs):
+        return connect2db(**kwargs)
+
+    def reset(self, conn):
+        conn.rollback()
+
+    def begin_snapshot(self, conn):
+        """Start a SNAPSHOT transaction, falling back to the default isolation if the database does not allow it"""
+        import warnings
+
+        cursor = conn.cursor()
+        try:
+            cursor.execute("SET TRANSACTION ISOLATION LEVEL SNAPSHOT")
+            # the snapshot is taken at the first read; this also fails if ALLOW_SNAPSHOT_ISOLATION is off
+            cursor.execute("SELECT COUNT(*) FROM Field").fetchall()
+        except Exception:
+            conn.rollback()
+            cursor.execute("SET TRANSACTION ISOLATION LEVEL READ COMMITTED")
+            warnings.warn(
+                "Snapshot isolation is not enabled on the database; "
+                "tables loaded together may not be consistent."
+            )
+        finally:
+            cursor.close()
+
+    def end_snapshot(self, conn):
+        conn.rollback()
+        cursor = conn.cursor()
+        cursor.execute("SET TRANSACTION ISOLATION LEVEL READ COMMITTED")
+        cursor.close()
+
+    def fetch_arrow(self, query_text, params=None, **kwargs):
+        """Read a query straight into Arrow record batches with arrow-odbc, or return None if it is not installed
+
+        arrow-odbc fills Arrow buffers from the ODBC driver in bulk without creating Python objects per row. It opens
+        its own connection, so pooled connections are not used on this path, nor inside `snapshot()`.
+        """
+        if _session_connection() is not None:
+            return None
+        try:
+            from arrow_odbc import read_arrow_batches_from_odbc
+        except ImportError:
+            return None
+        import pyarrow as pa
+
+        reader = read_arrow_batches_from_odbc(
+            query=query_text,
+            connection_string=_connection_string(**kwargs),
+            batch_size=65536,
+            parameters=None if params is None else [_odbc_text(p) for p in params],
+        )
+        return pa.Table.from_batches(list(reader), schema=reader.schema)
+
+    def fingerprint(self, tables, **kwargs):
+        """Row count and aggregate checksum of every table, which change when any row is inserted, edited or deleted"""
+        query = "\nUNION ALL\n".join(
+            f"SELECT '{table}' AS name, COUNT_BIG(*) AS n, "
+            f"CHECKSUM_AGG(BINARY_CHECKSUM(*)) AS checksum FROM {table}"
+            for table in tables
+        )
+        rows = db_query(query, memo=False, **kwargs)
+        return [
+            [name, int(n), None if _pd.isna(checksum) else int(checksum)]
+            for name, n, checksum in rows.itertuples(index=False)
+        ]
+
+    types = {
+        "key": "INT",
+        "text": "NVARCHAR(100)",
+        "datetime": "DATETIME2",
+        "float": "FLOAT",
+    }
+
+    def create_table(self, conn, table, key, columns):
+        cursor = conn.cursor()
+        cursor.execute(
+            f"IF OBJECT_ID('{table}', 'U') IS NULL CREATE TABLE "
+            + _table_definition(table, key, columns, self.types)
+        )
+        cursor.close()
+
+    def upsert(self, conn, table, key, columns, df, batch_size):
+        """Bulk insert into a temporary staging table with fast_executemany, then MERGE it into `table`"""
+        names = ", ".join([key] + columns)
+        cursor = conn.cursor()
+        cursor.fast_executemany = True  # send each batch as one parameter array
+        cursor.execute(f"SELECT TOP 0 {names} INTO #leiap_stage FROM {table}")
+        insert = (
+            f"INSERT INTO #leiap_stage ({names}) "
+            f"VALUES ({', '.join('?' * (len(columns) + 1))})"
+        )
+        rows = _parameter_rows(df, [key] + columns)
+        for start in range(0, len(rows), batch_size):
+            cursor.executemany(insert, rows[start : start + batch_size])
+        updates = ", ".join(f"{c} = source.{c}" for c in columns)
+        values = ", ".join(f"source.{c}" for c in [key] + columns)
+        cursor.execute(
+            f"""MERGE {table} AS target
+                USING #leiap_stage AS source ON target.{key} = source.{key}
+                WHEN MATCHED THEN UPDATE SET {updates}
+                WHEN NOT MATCHED THEN INSERT ({names}) VALUES ({values});"""
+        )
+        cursor.execute("DROP TABLE #leiap_stage")
+        cursor.close()
+
+
+class _SQLiteBackend:
+    """A local SQLite file with the project schema; credentials are ignored"""
+
+    name = "sqlite"
+
+    def __init__(self, path):
+        self.path = str(path)
+
+    def connect(self, **kwargs):
+        import sqlite3
+
+        # PARSE_DECLTYPES turns TIMESTAMP columns back into datetimes
+        return sqlite3.connect(
+            self.path, check_same_thread=False, detect_types=sqlite3.PARSE_DECLTYPES
+        )
+
+    def reset(self, conn):
+        conn.rollback()
+
+    def begin_snapshot(self, conn):
+        conn.execute("BEGIN")
+
+    def end_snapshot(self, conn):
+        conn.rollback()
+
+    def fetch_arrow(self, query_text, params=None, **kwargs):
+        return None  # SQLite has no columnar interface
+
+    def fingerprint(self, tables, **kwargs):
+        return _file_fingerprint(self.path, "-wal")
+
+    types = {"key": "INTEGER", "text": "TEXT", "datetime": "TIMESTAMP", "float": "REAL"}
+
+    def create_table(self, conn, table, key, columns):
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS "
+            + _table_definition(table, key, columns, self.types)
+        )
+
+    def upsert(self, conn, table, key, columns, df, batch_size):
+        names = [key] + columns
+        insert = (
+            f"INSERT INTO {table} ({', '.join(names)}) "
+            f"VALUES ({', '.join('?' * len(names))}) "
+            f"ON CONFLICT ({key}) DO UPDATE SET "
+            + ", ".join(f"{c} = excluded.{c}" for c in columns)
+        )
+        # stored as text in the format PARSE_DECLTYPES reads back as datetimes
+        rows = [
+            tuple(str(v) if isinstance(v, _pd.Timestamp) else v for v in row)
+            for row in _parameter_rows(df, names)
+        ]
+        for start in range(0, len(rows), batch_size):
+            conn.executemany(insert, rows[start : start + batch_size])
+
+
+class _DuckDBBackend:
+    """A local DuckDB file with the project schema; credentials are ignored"""
+
+    name = "duckdb"
+
+    def __init__(self, path):
+        self.path = str(path)
+
+    def connect(self, **kwargs):
+        import duckdb
+
+        return duckdb.connect(self.path)
+
+    def reset(self, conn):
+        # DuckDB autocommits and raises if ROLLBACK is sent outside a transaction
+        try:
+            conn.rollback()
+        except Exception:
+            pass
+
+    def begin_snapshot(self, conn):
+        conn.execute("BEGIN TRANSACTION")
+
+    def end_snapshot(self, conn):
+        conn.rollback()
+
+    def fetch_arrow(self, query_text, params=None, **kwargs):
+        """Read a query with DuckDB's native Arrow export"""
+        with pooled_connection(**kwargs) as conn:
+            return conn.execute(query_text, params or []).fetch_arrow_table()
+
+    def fingerprint(self, tables, **kwargs):
+        return _file_fingerprint(self.path, ".wal")
+
+    types = {
+        "key": "BIGINT",
+        "text": "VARCHAR",
+        "datetime": "TIMESTAMP",
+        "float": "DOUBLE",
+    }
+
+    def create_table(self, conn, table, key, columns):
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS "
+            + _table_definition(table, key, columns, self.types)
+        )
+
+    def upsert(self, conn, table, key, columns, df, batch_size):
+        """Insert the whole DataFrame in one statement; DuckDB scans it directly"""
+        names = ", ".join([key] + columns)
+        conn.register("_leiap_df", df[[key] + columns])
+        try:
+            conn.execute(
+                f"INSERT INTO {table} ({names}) SELECT {names} FROM _leiap_df "
+                f"ON CONFLICT ({key}) DO UPDATE SET "
+                + ", ".join(f"{c} = excluded.{c}" for c in columns)
+            )
+        finally:
+            conn.unregister("_leiap_df")
+
+
+def _table_definition(table, key, columns, types):
+    """`Table (key ... PRIMARY KEY, column type, ...)` for CREATE TABLE, using a backend's type names"""
+    definitions = [f"{key} {types['key']} PRIMARY KEY"] + [
+        f"{name} {types[kind]}" for name, kind in columns.items()
+    ]
+    return f"{table} ({', '.join(definitions)})"
+
+
+def _parameter_rows(df, columns):
+    """Rows of `df` as tuples of plain Python values, with None for missing values"""
+    values = df[columns].astype(object)
+    values = values.where(df[columns].notna(), None)
+    return list(values.itertuples(index=False, name=None))
+
+
+def _file_fingerprint(path, wal_suffix):
+    """Size and modification time of a local database file and its write-ahead log, if there is one"""
+    state = []
+    for p in (path, path + wal_suffix):
+        if _os.path.exists(p):
+            stat = _os.stat(p)
+            state.append([_os.path.basename(p), stat.st_size, stat.st_mtime_ns])
+    return state
+
+
+def _odbc_text(value):
+    """arrow-odbc binds parameters as text; format datetimes the way SQL Server parses them"""
+    import datetime
+
+    if value is None:
+        return None
+    if isinstance(value, datetime.datetime):
+        return value.strftime("%Y-%m-%d %H:%M:%S")
+    return str(value)
+
+
+_BACKENDS = {
+    "mssql": _SQLServerBackend,
+    "sqlite": _SQLiteBackend,
+    "duckdb": _DuckDBBackend,
+}
+_backend = {"current": _SQLServerBackend()}
+
+
+def use_backend(backend="mssql", path=None):
+    """Choose the database that every leiap.io query runs against
+
+    Parameters
+    ----------
+    backend : {'mssql', 'sqlite', 'duckdb'}
+        'mssql' is the central SQL Server database (the default). 'sqlite' and 'duckdb' are local files with the
+        project schema, e.g. made with `export_local_db()`.
+    path : str, optional
+        Location of the local database file; required for 'sqlite' and 'duckdb'
+
+    Examples
+    --------
+    >>> use_backend("sqlite", "leiap_2018.sqlite")
+    >>> points = get_points(years=[2018])  # runs offline
+    >>> use_backend()  # back to SQL Server
+    """
+    if backend not in _BACKENDS:
+        raise ValueError(f"`backend` must be one of {sorted(_BACKENDS)}")
+    if backend == "mssql":
+        _backend["current"] = _SQLServerBackend()
+    elif path is None:
+        raise ValueError(f"A `path` to the database file is needed for '{backend}'")
+    else:
+        _backend["current"] = _BACKENDS[backend](path)
+    close_pools()
+
+
+#######################################################################################################################
+
+
+class _ConnectionPool:
+    """Thread-safe pool of reusable database connections
+
+    Connections are handed out most-recently-used first. A connection that has sat idle for longer than
+    `idle_timeout` seconds, or that fails a cheap `SELECT 1` health check, is closed and replaced.
+    """
+
+    def __init__(self, connect, reset, size=4, idle_timeout=300):
+        self._connect = connect
+        self._reset = reset
+        self.size = size
+        self.idle_timeout = idle_timeout
+        self._idle = _deque()  # (connection, time it was returned to the pool)
+        self._lock = _threading.Lock()
+        self._slots = _threading.BoundedSemaphore(size)
+
+    def acquire(self):
+        """Check out a healthy connection, opening a new one if none are idle"""
+        if not self._slots.acquire(blocking=False):
+            with _timed("wait"):
+                self._slots.acquire()  # blocks while `size` connections are checked out
+        try:
+            while True:
+                with self._lock:
+                    if not self._idle:
+                        break
+                    conn, returned_at = self._idle.pop()
+                if _time.monotonic() - returned_at <= self.idle_timeout and _is_alive(
+                    conn
+                ):
+                    return conn
+                _close_quietly(conn)
+            with _timed("connect"):
+                return self._connect()
+        except BaseException:
+            self._slots.release()
+            raise
+
+    def release(self, conn, discard=False):
+        """Return a connection to the pool, or close it if `discard` is True or it cannot be reset"""
+        try:
+            if not discard:
+                try:
+                    # never hand out a connection with an open transaction
+                    self._reset(conn)
+                except Exception:
+                    discard = True
+            if discard:
+                _close_quietly(conn)
+            else:
+                with self._lock:
+                    self._idle.append((conn, _time.monotonic()))
+        finally:
+            self._slots.release()
+
+    def close(self):
+        """Close all idle connections"""
+        with self._lock:
+            idle, self._idle = self._idle, _deque()
+        for conn, _ in idle:
+            _close_quietly(conn)
+
+
+def _is_alive(conn):
+    try:
+        cursor = conn.cursor()
+        cursor.execute("SELECT 1")
+        cursor.fetchall()
+        cursor.close()
+        return True
+    except Exception:
+        return False
+
+
+def _close_quietly(conn):
+    try:
+        conn.close()
+    except Exception:
+        pass
+
+
+_pool_settings = {"size": 4, "idle_timeout": 300}
+_pools = {}
+_pools_lock = _threading.Lock()
+
+
+#######################################################################################################################
+
+
+def configure_pool(size=None, idle_timeout=None):
+    """Change the settings used for pooled database connections
+
+    Parameters
+    ----------
+    size : int, optional
+        Maximum number of connections open at once for each set of credentials
+    idle_timeout : int or float, optional
+        Seconds a connection may sit unused in the pool before it is closed instead of reused
+
+    Returns
+    -------
+    settings : dict
+        The pool settings now in effect
+
+    Notes
+    -----
+    Existing pools are closed so that the new settings take effect on the next query.
+    """
+    if size is not None:
+        if size < 1:
+            raise ValueError("`size` must be at least 1")
+        _pool_settings["size"] = size
+    if idle_timeout is not None:
+        _pool_settings["idle_timeout"] = idle_timeout
+    close_pools()
+    return dict(_pool_settings)
+
+
+#######################################################################################################################
+
+
+def close_pools():
+    """Close every idle pooled database connection
+
+    Connections that are checked out when this is called are closed when they are returned.
+    """
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        pool.close()
+
+
+#######################################################################################################################
+
+
+def _pool_key(kwargs):
+    backend = _backend["current"]
+    return (backend.name, backend.path) + tuple(sorted(kwargs.items()))
+
+
+def _get_pool(**kwargs):
+    key = _pool_key(kwargs)
+    backend = _backend["current"]
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = _ConnectionPool(
+                lambda: backend.connect(**kwargs),
+                backend.reset,
+                size=_pool_settings["size"],
+                idle_timeout=_pool_settings["idle_timeout"],
+            )
+            _pools[key] = pool
+    return pool
+
+
+@_contextmanager
+def pooled_connection(**kwargs):
+    """Borrow a database connection from the pool for the duration of a `with` block
+
+    Parameters
+    ----------
+    **kwargs
+        Optional arguments that are passed to connect2db(); each distinct set of arguments gets its own pool
+
+    Yields
+    ------
+    connection : DB-API connection
+        A pyodbc connection to SQL Server, or a connection to the local file chosen with `use_backend()`
+
+    Examples
+    --------
+    >>> with pooled_connection() as conn:
+    ...     df = pd.read_sql("SELECT * FROM Field", conn)
+    """
+    session_conn = _session_connection()
+    if session_conn is not None:  # inside snapshot(), every query shares its connection
+        yield session_conn
+        return
+
+    pool = _get_pool(**kwargs)
+    conn = pool.acquire()
+    try:
+        yield conn
+    finally:
+        pool.release(conn)
+        if pool is not _pools.get(_pool_key(kwargs)):
+            pool.close()  # pool was replaced or closed while the connection was checked out
+
+
+_session = _threading.local()
+
+
+def _session_connection():
+    return getattr(_session, "conn", None)
+
+
+@_contextmanager
+def snapshot(**kwargs):
+    """Run every leiap.io query in a `with` block on one connection, inside one read-only transaction
+
+    Parameters
+    ----------
+    **kwargs
+        Optional arguments that are passed to connect2db()
+
+    Yields
+    ------
+    connection : DB-API connection
+
+    Notes
+    -----
+    On SQL Server this uses SNAPSHOT isolation, so all queries see the database as it was when the first one ran
+    even while data entry continues. If snapshot isolation is not enabled on the database, a warning is issued and
+    the default isolation level is used. Queries in the block run one after another on the calling thread.
+
+    Examples
+    --------
+    >>> with snapshot():
+    ...     points = get_points()
+    ...     artifacts = get_artifacts(sections=["all"])
+    """
+    if _session_connection() is not None:  # already inside a snapshot
+        yield _session_connection()
+        return
+
+    backend = _backend["current"]
+    with pooled_connection(**kwargs) as conn:
+        backend.begin_snapshot(conn)
+        _session.conn = conn
+        try:
+            yield conn
+        finally:
+            _session.conn = None
+            backend.end_snapshot(conn)
+
+
+#######################################################################################################################
+
+
+_profile_settings = {"enabled": False, "log": False, "active": 0}
+_query_stats = _deque(maxlen=10000)
+_profiles = []
+_profile_lock = _threading.Lock()
+
+
+def enable_profiling(enabled=True, log=False):
+    """Record how long each stage of every leiap.io query and loader takes
+
+    Parameters
+    ----------
+    enabled : bool
+        If True, keep a record of every connection, query, fetch and loader call. See `get_query_stats()`.
+    log : bool
+        If True, also write each record as a JSON message to the `leiap.io` logger at INFO level
+
+    Notes
+    -----
+    Recording is off by default. Use `profile()` to record only the calls in a `with` block.
+    """
+    _profile_settings["enabled"] = bool(enabled)
+    _profile_settings["log"] = bool(log)
+
+
+#######################################################################################################################
+
+
+def get_query_stats():
+    """The records kept since profiling was turned on with `enable_profiling()`
+
+    Returns
+    -------
+    stats : pandas DataFrame
+        One row per recorded stage, oldest first, with the columns:
+
+        - `started`: when the stage began
+        - `stage`: 'connect', 'wait' (for a pooled connection), 'memo' (result reused from memory), 'execute',
+          'fetch' and 'frame' (building the DataFrame from the fetched rows), 'arrow_fetch', 'to_pandas', 'postprocess'
+          (loader work after the queries) or 'loader' (a whole loader call)
+        - `name`: the loader, for 'loader' and 'postprocess' stages
+        - `seconds`: wall time
+        - `rows`, `bytes`: size of the result, where there is one
+        - `query`: the SQL text, shortened
+        - `thread`: name of the thread that ran the stage
+
+    Notes
+    -----
+    Only the latest 10,000 records are kept. See `clear_query_stats()`.
+    """
+    with _profile_lock:
+        records = list(_query_stats)
+    return _pd.DataFrame(records, columns=_STATS_COLUMNS)
+
+
+def clear_query_stats():
+    """Forget the records kept by `enable_profiling()`"""
+    with _profile_lock:
+        _query_stats.clear()
+
+
+_STATS_COLUMNS = [
+    "started",
+    "stage",
+    "name",
+    "seconds",
+    "rows",
+    "bytes",
+    "query",
+    "thread",
+]
+
+
+#######################################################################################################################
+
+
+class QueryProfile:
+    """Records of the leiap.io calls made inside a `profile()` block
+
+    Attributes
+    ----------
+    records : list of dict
+        One dict per recorded stage; see `get_query_stats()` for the keys
+    """
+
+    def __init__(self):
+        self.records = []
+
+    def __repr__(self):
+        return f"<QueryProfile: {len(self.records)} records>"
+
+    def to_frame(self):
+        """The records as a DataFrame, in the same layout as `get_query_stats()`"""
+        return _pd.DataFrame(self.records, columns=_STATS_COLUMNS)
+
+    def summary(self):
+        """Number of calls, total seconds, rows and bytes for each stage, slowest first"""
+        return (
+            self.to_frame()
+            .groupby("stage")
+            .agg(
+                calls=("seconds", "size"),
+                seconds=("seconds", "sum"),
+                rows=("rows", "sum"),
+                bytes=("bytes", "sum"),
+            )
+            .sort_values("seconds", ascending=False)
+        )
+
+
+@_contextmanager
+def profile():
+    """Record how long each stage of the leiap.io calls in a `with` block takes
+
+    Yields
+    ------
+    profile : QueryProfile
+        Filled in as the calls run, including those on worker threads started by the loaders
+
+    Examples
+    --------
+    >>> with profile() as prof:
+    ...     checks = check_all()
+    >>> prof.summary()
+    """
+    prof = QueryProfile()
+    with _profile_lock:
+        _profiles.append(prof)
+        _profile_settings["active"] += 1
+    try:
+        yield prof
+    finally:
+        with _profile_lock:
+            _profiles.remove(prof)
+            _profile_settings["active"] -= 1
+
+
+def _profiling():
+    return _profile_settings["enabled"] or _profile_settings["active"] > 0
+
+
+def _result_size(result):
+    """Rows and bytes of a DataFrame or pyarrow Table, or (None, None)"""
+    if isinstance(result, _pd.DataFrame):
+        return len(result), int(result.memory_usage(index=True, deep=True).sum())
+    if hasattr(result, "num_rows") and hasattr(result, "nbytes"):
+        return result.num_rows, result.nbytes
+    return None, None
+
+
+@_contextmanager
+def _timed(stage, name=None, query=None):
+    """Time the body of a `with` block as one stage; the yielded dict takes a `result` whose size is recorded"""
+    if not _profiling():
+        yield {}
+        return
+
+    import datetime
+
+    record = {"started": datetime.datetime.now()}
+    start = _time.perf_counter()
+    try:
+        yield record
+    finally:
+        seconds = _time.perf_counter() - start
+        rows, nbytes = _result_size(record.pop("result", None))
+        record.update(
+            stage=stage,
+            name=name,
+            seconds=seconds,
+            rows=rows,
+            bytes=nbytes,
+            query=None if query is None else " ".join(query.split())[:200],
+            thread=_threading.current_thread().name,
+        )
+        _record(record)
+
+
+def _record(record):
+    with _profile_lock:
+        if _profile_settings["enabled"]:
+            _query_stats.append(record)
+        for prof in _profiles:
+            prof.records.append(record)
+    if _profile_settings["log"]:
+        import json
+        import logging
+
+        logging.getLogger(__name__).info(json.dumps(record, default=str))
+
+
+def _instrumented(loader):
+    """Record each call of a loader as a 'loader' stage"""
+    from functools import wraps
+
+    @wraps(loader)
+    def wrapper(*args, **kwargs):
+        with _timed("loader", name=loader.__name__) as record:
+            result = loader(*args, **kwargs)
+            record["result"] = result
+        return result
+
+    return wrapper
+
+
+#######################################################################################################################
+
+
+_memo_settings = {
+    "ttl": 60,
+    "maxsize": 16,
+    "maxbytes": 512 * 2 ** 20,
+    "enabled": False,
+    "active": 0,
+}
+_memo = _OrderedDict()
+_memo_lock = _threading.Lock()
+
+# pandas >= 3 always copies on write, so a shallow copy is enough to keep callers from changing a remembered result
+_COPY_ON_WRITE = int(_pd.__version__.split(".")[0]) >= 3
+
+
+def configure_memo(ttl=None, maxsize=None, maxbytes=None, enabled=None):
+    """Change the settings used to remember query results in memory
+
+    Parameters
+    ----------
+    ttl : int or float, optional
+        Seconds a remembered result may be reused before the database is queried again. Set to 0 to turn
+        memoization off.
+    maxsize : int, optional
+        Maximum number of results kept; the least recently used result is dropped first. Set to 0 to turn
+        memoization off.
+    maxbytes : int, optional
+        Maximum total memory (`DataFrame.memory_usage(deep=True)`) of the results kept; the least recently used
+        results are dropped first, and a single result larger than this is not kept at all
+    enabled : bool, optional
+        If True, remember the results of every query. By default results are only remembered inside `memoize()`
+        or when `db_query()` is called with `memo=True`.
+
+    Returns
+    -------
+    settings : dict
+        The memoization settings now in effect
+
+    Notes
+    -----
+    Results already remembered are cleared so that the new settings take effect on the next query.
+    """
+    if ttl is not None:
+        if ttl < 0:
+            raise ValueError("`ttl` cannot be negative")
+        _memo_settings["ttl"] = ttl
+    if maxsize is not None:
+        if maxsize < 0:
+            raise ValueError("`maxsize` cannot be negative")
+        _memo_settings["maxsize"] = maxsize
+    if maxbytes is not None:
+        if maxbytes < 0:
+            raise ValueError("`maxbytes` cannot be negative")
+        _memo_settings["maxbytes"] = maxbytes
+    if enabled is not None:
+        _memo_settings["enabled"] = bool(enabled)
+    clear_cache()
+    return {k: v for k, v in _memo_settings.items() if k != "active"}
+
+
+@_contextmanager
+def memoize():
+    """Remember query results in memory inside a `with` block, so repeated loads query the database only once
+
+    Notes
+    -----
+    Results are forgotten when the last `memoize()` block exits (unless memoization was turned on for every query
+    with `configure_memo(enabled=True)`), so they do not hold on to memory afterwards.
+
+    Examples
+    --------
+    >>> with memoize():
+    ...     points = get_points()
+    ...     cts_wts = get_production_cts_wts()  # reuses the points query
+    """
+    with _memo_lock:
+        _memo_settings["active"] += 1
+    try:
+        yield
+    finally:
+        with _memo_lock:
+            _memo_settings["active"] -= 1
+            if _memo_settings["active"] == 0 and not _memo_settings["enabled"]:
+                _memo.clear()
+
+
+def _memoizing():
+    return _memo_settings["enabled"] or _memo_settings["active"] > 0
+
+
+#######################################################################################################################
+
+
+def clear_cache():
+    """Forget every query result remembered in memory, so the next query of each goes to the database
+
+    Returns
+    -------
+    n : int
+        Number of results forgotten
+
+    Notes
+    -----
+    This does not touch the on-disk cache of `load_cached()`; see `invalidate_cache()` for that.
+    """
+    with _memo_lock:
+        n = len(_memo)
+        _memo.clear()
+    return n
+
+
+def _memo_key(query_text, params, arrow, kwargs):
+    backend = _backend["current"]
+    return (backend.name, backend.path, query_text, tuple(params or ()), arrow) + tuple(
+        sorted(kwargs.items())
+    )
+
+
+def _memo_copy(df):
+    """Copy of a remembered result for a caller; shallow where pandas copies on write"""
+    return df.copy(deep=not _COPY_ON_WRITE)
+
+
+def _memo_get(key):
+    with _memo_lock:
+        entry = _memo.get(key)
+        if entry is None:
+            return None
+        stored_at, df, _ = entry
+        if _time.monotonic() - stored_at > _memo_settings["ttl"]:
+            del _memo[key]
+            return None
+        _memo.move_to_end(key)
+        return df
+
+
+def _memo_put(key, df):
+    nbytes = int(df.memory_usage(index=True, deep=True).sum())
+    with _memo_lock:
+        _memo.pop(key, None)
+        if nbytes > _memo_settings["maxbytes"]:
+            return
+        _memo[key] = (_time.monotonic(), df, nbytes)
+        total = sum(entry[2] for entry in _memo.values())
+        while (
+            len(_memo) > _memo_settings["maxsize"]
+            or total > _memo_settings["maxbytes"]
+        ):
+            _, (_, _, dropped) = _memo.popitem(last=False)
+            total -= dropped
+
+
+#######################################################################################################################
+
+
+def db_query(query_text, params=None, arrow=None, memo=None, **kwargs):
+    """Send any SQL query to the database
+    
+    Parameters
+    ----------
+    query_text : str
+        Full SQL query to pass to the database
+    params : list, optional
+        Values for the `?` placeholders in `query_text`
+    arrow : bool, optional
+        If True, read the results with `db_query_arrow()` and return a DataFrame backed by Arrow arrays
+        (`pandas.ArrowDtype`; datetime columns stay datetime64). Defaults to the setting of `use_arrow_fetch()`,
+        which is off.
+    memo : bool, optional
+        If True, reuse the result of an identical recent query (same text, parameters and credentials) instead of
+        querying the database again. Defaults to True inside `memoize()` and False elsewhere. See `configure_memo()`
+        and `clear_cache()`.
+    **kwargs
+        Optional arguments that are passed to get_credentials()
+
+    Returns
+    -------
+    df : pandas DataFrame
+        DataFrame of query results
+
+    Notes
+    -----
+    Connections are reused from a pool rather than opened for every query. See `configure_pool()`. The query runs
+    against the database chosen with `use_backend()`, SQL Server by default.
+
+    Every loader in this module goes through `db_query()`, so repeated loads inside `memoize()` (e.g. the several
+    `get_artifacts()` calls made by `check_all()`) share remembered results. Each caller gets its own copy (a lazy
+    one with pandas >= 3). Queries inside `snapshot()` are never answered from memory.
+    """
+    if arrow is None:
+        arrow = _fetch_settings["arrow"]
+    if memo is None:
+        memo = _memoizing()
+    memo = (
+        memo
+        and _memo_settings["ttl"] > 0
+        and _memo_settings["maxsize"] > 0
+        and _session_connection() is None
+    )
+    if memo:
+        key = _memo_key(query_text, params, arrow, kwargs)
+        df = _memo_get(key)
+        if df is not None:
+            with _timed("memo", query=query_text) as record:
+                df = record["result"] = _memo_copy(df)
+            return df
+
+    if arrow:
+        table = db_query_arrow(query_text, params=params, **kwargs)
+        with _timed("to_pandas", query=query_text) as record:
+            df = record["result"] = table.to_pandas(types_mapper=_arrow_dtype)
+    else:
+        with pooled_connection(**kwargs) as conn:
+            cursor = conn.cursor()
+            try:
+                with _timed("execute", query=query_text):
+                    cursor.execute(query_text, params or [])
+                columns = [d[0] for d in cursor.description]
+                with _timed("fetch", query=query_text):
+                    rows = cursor.fetchall()
+            finally:
+                cursor.close()
+        with _timed("frame", query=query_text) as record:
+            df = record["result"] = _pd.DataFrame.from_records(
+                [tuple(row) for row in rows], columns=columns, coerce_float=True
+            )
+
+    if memo:
+        _memo_put(key, df)
+        return _memo_copy(df)
+    return df
+
+
+#######################################################################################################################
+
+
+_fetch_settings = {"arrow": False}
+
+
+def _arrow_dtype(arrow_type):
+    """Keep Arrow arrays for all columns except datetimes, which stay datetime64 for the `.dt` code in leiap.time"""
+    import pyarrow as pa
+
+    if pa.types.is_timestamp(arrow_type) or pa.types.is_date(arrow_type):
+        return None
+    return _pd.ArrowDtype(arrow_type)
+
+
+def use_arrow_fetch(enabled=True):
+    """Make every query (including those run by the loaders) return Arrow-backed DataFrames
+
+    Parameters
+    ----------
+    enabled : bool
+        If True, `db_query()` reads results through `db_query_arrow()` unless told otherwise
+    """
+    _fetch_settings["arrow"] = bool(enabled)
+
+
+def db_query_arrow(query_text, params=None, **kwargs):
+    """Send any SQL query to the database and read the results as a pyarrow Table
+
+    Parameters
+    ----------
+    query_text : str
+        Full SQL query to pass to the database
+    params : list, optional
+        Values for the `?` placeholders in `query_text`
+    **kwargs
+        Optional arguments that are passed to get_credentials()
+
+    Returns
+    -------
+    table : pyarrow Table
+        Table of query results
+
+    Notes
+    -----
+    On SQL Server the results are fetched column by column with `arrow-odbc`, and on DuckDB with its native Arrow
+    export, so no Python object is created per row. If neither is available (e.g. `arrow-odbc` is not installed, or
+    the backend is SQLite), the regular `db_query()` path is used and its DataFrame is converted.
+    """
+    import pyarrow as pa
+
+    with _timed("arrow_fetch", query=query_text) as record:
+        table = record["result"] = _backend["current"].fetch_arrow(
+            query_text, params=params, **kwargs
+        )
+    if table is None:
+        df = db_query(query_text, params=params, arrow=False, memo=False, **kwargs)
+        table = pa.Table.from_pandas(df, preserve_index=False)
+    return table
+
+
+#######################################################################################################################
+
+
+def db_query_chunks(query_text, chunksize=50000, params=None, **kwargs):
+    """Send any SQL query to the database and read the results a chunk at a time
+
+    Parameters
+    ----------
+    query_text : str
+        Full SQL query to pass to the database
+    chunksize : int
+        Maximum number of rows in each chunk
+    params : list, optional
+        Values for the `?` placeholders in `query_text`
+    **kwargs
+        Optional arguments that are passed to get_credentials()
+
+    Yields
+    ------
+    df : pandas DataFrame
+        DataFrame of the next `chunksize` (or fewer) query results, indexed by row number in the whole result (so the
+        chunks concatenate to the same index as `db_query()`). A query with no results yields one empty DataFrame.
+
+    Notes
+    -----
+    Rows are fetched from the open cursor as the chunks are consumed, so memory use is bounded by `chunksize`. The
+    pooled connection is held until the generator is exhausted or closed. As in `db_query()`, decimal values are
+    converted to floats.
+    """
+    with pooled_connection(**kwargs) as conn:
+        cursor = conn.cursor()
+        try:
+            with _timed("execute", query=query_text):
+                cursor.execute(query_text, params or [])
+            columns = [d[0] for d in cursor.description]
+            start = 0
+            first = True
+            while True:
+                with _timed("fetch", query=query_text):
+                    rows = cursor.fetchmany(chunksize)
+                if not rows and not first:
+                    break
+                first = False
+                with _timed("frame", query=query_text) as record:
+                    df = record["result"] = _pd.DataFrame.from_records(
+                        [tuple(row) for row in rows],
+                        columns=columns,
+                        coerce_float=True,
+                        index=_pd.RangeIndex(start, start + len(rows)),
+                    )
+                start += len(rows)
+                yield df
+                if len(rows) < chunksize:
+                    break
+        finally:
+            cursor.close()
+
+
+#######################################################################################################################
+
+
+def db_query_partitioned(query_text, key, partitions=4, params=None, **kwargs):
+    """Send any SQL query to the database, split into key ranges that are read at the same time
+
+    Parameters
+    ----------
+    query_text : str
+        Full SQL query to pass to the database; it is used as a subquery, so it cannot end with ORDER BY
+    key : str
+        Numeric column of the results to split on, e.g. 'SherdId' or 'SurveyPointId'
+    partitions : int
+        Number of key ranges, each read over its own pooled connection. See `configure_pool()` for how many run at
+        once.
+    params : list, optional
+        Values for the `?` placeholders in `query_text`
+    **kwargs
+        Optional arguments that are passed to get_credentials()
+
+    Returns
+    -------
+    df : pandas DataFrame
+        DataFrame of query results, in order of the key ranges
+
+    Notes
+    -----
+    The ranges are of equal width between the smallest and largest key, which are found with one extra query. Ids
+    are assigned sequentially, so the ranges hold about the same number of rows. Inside `snapshot()` the ranges are
+    read one after another.
+    """
+    lo, hi = _key_bounds(query_text, key, params=params, **kwargs)
+    queries = {}
+    for i, clause in enumerate(_key_ranges(f"q.{key}", lo, hi, partitions)):
+        where, range_params = _where([clause])
+        queries[i] = (
+            f"SELECT * FROM ({query_text}) AS q {where}",
+            list(params or []) + range_params,
+        )
+    results = _run_queries(queries, **kwargs)
+    return _concat_parts([results[i] for i in sorted(results)])
+
+
+#######################################################################################################################
+
+
+def _year_clause(column, years):
+    """Build a WHERE condition restricting a datetime column to whole calendar years
+
+    Each year becomes a half-open date range so the server can use an index on `column`.
+    """
+    import datetime
+
+    years = sorted({int(year) for year in years})
+    conditions = " OR ".join([f"({column} >= ? AND {column} < ?)"] * len(years))
+    params = []
+    for year in years:
+        params += [datetime.datetime(year, 1, 1), datetime.datetime(year + 1, 1, 1)]
+    return f"({conditions})", params
+
+
+def _where(clauses):
+    """Combine (condition, params) pairs into a WHERE clause and its parameter list"""
+    clauses = [c for c in clauses if c is not None]
+    if not clauses:
+        return "", []
+    sql = "WHERE " + " AND ".join(condition for condition, _ in clauses)
+    params = [p for _, clause_params in clauses for p in clause_params]
+    return sql, params
+
+
+def _key_ranges(column, lo, hi, partitions):
+    """Clauses splitting `column` into `partitions` contiguous ranges of about equal width between `lo` and `hi`
+
+    The first and last ranges are open-ended, so every row is covered even if `lo` and `hi` are out of date.
+    """
+    if partitions is None or partitions < 2 or lo is None or hi is None:
+        return [None]
+    step = (hi - lo + 1) / partitions
+    cuts = sorted({int(lo + round(step * i)) for i in range(1, partitions)})
+    clauses = [(f"{column} < ?", [cuts[0]])]
+    for start, stop in zip(cuts, cuts[1:]):
+        clauses.append((f"{column} >= ? AND {column} < ?", [start, stop]))
+    clauses.append((f"{column} >= ?", [cuts[-1]]))
+    return clauses
+
+
+def _key_bounds(query_text, key, params=None, **kwargs):
+    """Smallest and largest `key` in the results of a query (None, None if there are none)"""
+    bounds = db_query(
+        f"SELECT MIN(q.{key}) AS lo, MAX(q.{key}) AS hi FROM ({query_text}) AS q",
+        params=params,
+        **kwargs,
+    ).iloc[0]
+    return tuple(None if _pd.isna(v) else int(v) for v in bounds)
+
+
+def _concat_parts(frames):
+    """Concatenate the results of partitioned queries in order, with the dtypes one query would have given"""
+    nonempty = [df for df in frames if len(df)] or frames[:1]
+    if len(nonempty) == 1:
+        return nonempty[0]
+    combined = _pd.concat(nonempty, ignore_index=True)
+    # a column that is all NULL in one part comes back as object, dragging the rest along
+    for col in combined.columns:
+        if len({str(df[col].dtype) for df in nonempty}) > 1:
+            combined[col] = combined[col].infer_objects()
+    return combined
+
+
+#######################################################################################################################
+
+
+class LeiapQuery:
+    """Filters on points or artifacts that are applied by the database, so only the matching rows are downloaded
+
+    Each method returns a new LeiapQuery with one more filter (replacing an earlier filter of the same kind), so
+    queries can be built up step by step and reused. Pass one as `filters` to `get_points()`, `get_artifacts()` or
+    `get_artifacts_chunks()`, or call its `points()` and `artifacts()` methods.
+
+    Examples
+    --------
+    >>> q = LeiapQuery().fields("03027", "16092").between("2016-06-01", "2016-07-01")
+    >>> points = q.points()
+    >>> roman = q.productions("Roman").artifacts(sections=["metrics"])
+    """
+
+    # column each filter applies to; dates use the same column as `years`
+    _COLUMNS = {
+        "points": {
+            "fields": "Field.FieldNumber",
+            "surveyors": "Surveyor.SurveyorName",
+            "date": "SurveyPoint.DataDate",
+        },
+        "artifacts": {
+            "fields": "Field.FieldNumber",
+            "surveyors": "Surveyor.SurveyorName",
+            "productions": "FabricType.FabricTypeName",
+            "date": "Sherd.ChangedDate",
+        },
+    }
+
+    def __init__(self, **filters):
+        self.filters = filters
+
+    def __repr__(self):
+        filters = ", ".join(f"{k}={v!r}" for k, v in self.filters.items())
+        return f"LeiapQuery({filters})"
+
+    def _add(self, **filters):
+        return LeiapQuery(**dict(self.filters, **filters))
+
+    def years(self, *years):
+        """Keep rows from some years (points by `DataDate`, artifacts by `ChangedDate`)"""
+        return self._add(years=list(years))
+
+    def fields(self, *field_numbers):
+        """Keep rows from some fields, by `FieldNumber` (e.g. '03027')"""
+        return self._add(fields=list(field_numbers))
+
+    def surveyors(self, *names):
+        """Keep rows recorded by some surveyors, by `SurveyorName`"""
+        return self._add(surveyors=list(names))
+
+    def productions(self, *names):
+        """Keep artifacts of some productions (`FabricTypeName`), or points where any such artifact was found"""
+        return self._add(productions=list(names))
+
+    def between(self, start=None, end=None):
+        """Keep rows dated from `start` (inclusive) up to `end` (exclusive); either may be left open"""
+        start = None if start is None else _pd.Timestamp(start).to_pydatetime()
+        end = None if end is None else _pd.Timestamp(end).to_pydatetime()
+        return self._add(between=(start, end))
+
+    def clauses(self, target):
+        """The filters as a list of (condition, params) clauses for a 'points' or 'artifacts' query"""
+        columns = self._COLUMNS[target]
+        clauses = []
+        if self.filters.get("years"):
+            clauses.append(_year_clause(columns["date"], self.filters["years"]))
+        for name in ["fields", "surveyors", "productions"]:
+            values = self.filters.get(name)
+            if values is None:
+                continue
+            if name in columns:
+                clauses.append(_in_clause(columns[name], values))
+            else:  # points where some artifact matches
+                subquery, params = _artifacts_sql(
+                    ["Sherd.SurveyPointId"],
+                    [_in_clause(self._COLUMNS["artifacts"][name], values)],
+                )
+                clauses.append((f"SurveyPoint.SurveyPointId IN ({subquery})", params))
+        start, end = self.filters.get("between", (None, None))
+        if start is not None:
+            clauses.append((f"{columns['date']} >= ?", [start]))
+        if end is not None:
+            clauses.append((f"{columns['date']} < ?", [end]))
+        return clauses
+
+    def points(self, **kwargs):
+        """Load the matching points with `get_points()`"""
+        return get_points(filters=self, **kwargs)
+
+    def artifacts(self, sections=["base"], **kwargs):
+        """Load the matching artifacts with `get_artifacts()`"""
+        return get_artifacts(sections, filters=self, **kwargs)
+
+
+def _in_clause(column, values):
+    """Clause keeping rows whose `column` is one of `values` (none, if `values` is empty)"""
+    values = list(values)
+    if not values:
+        return ("1 = 0", [])
+    return (f"{column} IN ({', '.join('?' * len(values))})", values)
+
+
+#######################################################################################################################
+
+
+# Measurement columns that do not need more precision than float32 (coordinates do, so they are left as float64)
+_FLOAT32_COLUMNS = ["Length", "Width", "Thickness", "Weight"]
+
+
+def compact_dtypes(df, max_category_ratio=0.5, verbose=True):
+    """Shrink a DataFrame by converting columns to smaller dtypes
+
+    Parameters
+    ----------
+    df : pandas DataFrame
+        Points, artifacts, or productions DataFrame
+    max_category_ratio : float
+        String columns with at most this many unique values per row are converted to `category`
+    verbose : bool
+        If True, print the memory used before and after
+
+    Returns
+    -------
+    df : pandas DataFrame
+        Copy of `df` where repeated strings are categorical, integer columns (IDs, counts) use the smallest integer
+        type that fits, and Length/Width/Thickness/Weight are float32
+
+    Notes
+    -----
+    Whole-number float columns whose names end in 'Id' (integer IDs that contain missing values) become nullable
+    integers. Sparse columns are left as they are.
+    """
+    before = df.memory_usage(deep=True).sum()
+    df = df.copy()
+
+    for col in df.columns:
+        s = df[col]
+        if isinstance(s.dtype, _pd.SparseDtype):
+            continue
+        if _pd.api.types.is_object_dtype(s) or _pd.api.types.is_string_dtype(s):
+            if s.notna().any() and s.nunique() <= max_category_ratio * len(s):
+                df[col] = s.astype("category")
+        elif _pd.api.types.is_integer_dtype(s):
+            df[col] = _pd.to_numeric(s, downcast="integer")
+        elif _pd.api.types.is_float_dtype(s):
+            if col in _FLOAT32_COLUMNS:
+                df[col] = s.astype("float32")
+            elif col.endswith("Id") and (s.dropna() % 1 == 0).all():
+                df[col] = _pd.to_numeric(s.astype("Int64"), downcast="integer")
+
+    if verbose:
+        after = df.memory_usage(deep=True).sum()
+        saved = 100 * (1 - after / before) if before else 0
+        print(
+            f"Compact dtypes: {before / 1e6:.1f} MB -> {after / 1e6:.1f} MB "
+            f"({saved:.0f}% smaller)"
+        )
+    return df
+
+
+#######################################################################################################################
+
+
+@_instrumented
+def get_points(
+    years=None, compact=False, derived=False, partitions=None, filters=None, **kwargs
+):
+    """Load a DataFrame of points
+
+    Parameters
+    ----------
+    years : list
+        List of desired years; can be strings or integers
+    compact : bool
+        If True, shrink the DataFrame with `compact_dtypes()` and print how much memory was saved
+    derived : bool
+        If True, join the 'geo_field', 'dt_adj', 'search_time' and 'dist' columns saved by `write_derived()` instead of
+        computing them again. Points without saved values get missing values.
+    partitions : int, optional
+        If given, split the query into this many SurveyPointId ranges read at the same time over separate pooled
+        connections (see `db_query_partitioned()`)
+    filters : LeiapQuery, optional
+        Further filters on field, surveyor, production or date applied in the database; see `LeiapQuery`
+    **kwargs
+        Optional arguments that are passed to get_credentials()
+
+    Returns
+    -------
+    points_df : pandas DataFrame
+        DataFrame of all points
+    """
+    clauses = [_year_clause("SurveyPoint.DataDate", years) if years else None]
+    if filters is not None:
+        clauses += filters.clauses("points")
+    points_df = _load_points(clauses, derived=derived, partitions=partitions, **kwargs)
+    if compact:
+        points_df = compact_dtypes(points_df)
+    return points_df
+
+
+def _load_points(clauses=(), derived=False, partitions=None, **kwargs):
+    """Run the get_points() query restricted by a list of (condition, params) clauses"""
+    query = """SELECT SurveyPoint.*, Field.FieldNumber, Surveyor.SurveyorName 
+               FROM SurveyPoint 
+               LEFT JOIN Field ON SurveyPoint.FieldId=Field.FieldId
+               LEFT JOIN Surveyor ON SurveyPoint.SurveyorId=Surveyor.SurveyorId
+               """
+    if derived:
+        _, types = _DERIVED_TABLES["SurveyPointDerived"]
+        query = (
+            query.replace(
+                "FROM SurveyPoint",
+                "".join(f", SurveyPointDerived.{c}" for c in types)
+                + "\n               FROM SurveyPoint",
+                1,
+            )
+            + "LEFT JOIN SurveyPointDerived "
+            + "ON SurveyPoint.SurveyPointId=SurveyPointDerived.SurveyPointId\n"
+        )
+    ranges = [None]
+    if partitions:
+        lo, hi = _key_bounds(
+            "SELECT SurveyPointId FROM SurveyPoint", "SurveyPointId", **kwargs
+        )
+        ranges = _key_ranges("SurveyPoint.SurveyPointId", lo, hi, partitions)
+    queries = {}
+    for i, key_range in enumerate(ranges):
+        where, params = _where(list(clauses) + [key_range])
+        queries[i] = (query + where, params)
+    results = _run_queries(queries, **kwargs)
+    points_df = _concat_parts([results[i] for i in range(len(ranges))])
+    points_df = points_df.drop(columns=["SherdCount", "tempFixIDs"])
+    if derived:
+        points_df["dt_adj"] = _pd.to_datetime(points_df["dt_adj"])
+        for col in ["search_time", "dist"]:
+            points_df[col] = points_df[col].astype(float)
+
+    return points_df
+
+
+#######################################################################################################################
+
+
+def get_points_simple(**kwargs):
+    """Load a DataFrame of points with the most typical query
+
+    Parameters
+    ----------
+    **kwargs
+        Optional arguments that are passed to get_credentials()
+
+    Returns
+    -------
+    points_df : pandas DataFrame
+        DataFrame of all points
+    """
+    import warnings
+
+    warnings.warn(
+        """get_points_simple() is no longer preferred. Use get_points() with appropriate parameters instead.""",
+        DeprecationWarning,
+    )
+
+    query = """SELECT SurveyPoint.*, Field.FieldNumber, Surveyor.SurveyorName 
+               FROM SurveyPoint 
+               LEFT JOIN Field ON SurveyPoint.FieldId=Field.FieldId
+               LEFT JOIN Surveyor ON SurveyPoint.SurveyorId=Surveyor.SurveyorId
+               """
+    points_df = db_query(query, **kwargs)
+    return points_df
+
+
+#######################################################################################################################
+
+
+def get_points_by_year(years, **kwargs):
+    """Load a DataFrame of points with the most typical query for specified year(s)
+
+    Parameters
+    ----------
+    years : list
+        List of desired years; can be strings or integers
+    **kwargs
+        Optional arguments that are passed to get_credentials()
+
+    Returns
+    -------
+    points_df : pandas DataFrame
+        DataFrame of all points for specified year(s)
+    """
+    import warnings
+
+    warnings.warn(
+        """get_points_by_year() is no longer preferred. Use get_points() with appropriate parameters instead.""",
+        DeprecationWarning,
+    )
+
+    points_df = get_points_simple(**kwargs)
+    points_df = points_df[points_df.DataDate.dt.year.isin(years)]
+    return points_df
+
+
+#######################################################################################################################
+
+
+# Source column for every output column of get_artifacts(), grouped by section
+_ARTIFACT_COLUMNS = {
+    "base": [
+        "Sherd.SherdId",
+        "Sherd.FieldId",
+        "Sherd.SurveyorId",
+        "Sherd.PointId",
+        "Sherd.SherdNum",
+        "Sherd.SurveyPointId",
+        "Sherd.ChangedDate",
+        "Field.FieldNumber",
+        "SurveyPoint.Northing",
+        "SurveyPoint.Easting",
+        "Surveyor.SurveyorName",
+    ],
+    "metrics": ["Sherd.Length", "Sherd.Width", "Sherd.Thickness", "Sherd.Weight"],
+    "classify": [
+        "Sherd.MaterialTypeName",
+        "Sherd.ManufactureMethod",
+        "ManufactureMethod.ManufactureName",
+        "FabricType.FabricTypeName",
+        "Sherd.Form",
+        "Sherd.Note",
+        "Sherd.VesselPartOther",
+        "Sherd.WareTypeOther",
+    ],
+    "production": [
+        "FabricType.Chronology",
+        "FabricType.CultureOther",
+        "FabricType.RegionOther",
+        "FabricType.EnteredDate",
+        "FabricType.EarlyChrono",
+        "FabricType.LateChrono",
+        "FabricType.Catalan",
+    ],
+    "tile_brick": [
+        "Sherd.TileType",
+        "Sherd.TileIsStamped",
+        "Sherd.TileIsCurved",
+        "Sherd.BrickIsStamped",
+    ],
+    "macro_fabric": [
+        "Sherd.SherdCondition",
+        "Sherd.SurfaceTexture",
+        "Sherd.SurfTextureOther",
+        "Sherd.SurfaceCondition",
+        "Sherd.SurvCondOther",
+        "Sherd.SurfaceTreatExt",
+        "Sherd.STEOther",
+        "Sherd.SurfaceTreatInt",
+        "Sherd.STIOther",
+        "Sherd.HardnessSurface",
+        "Sherd.HardnessCore",
+        "Sherd.FiringCore",
+        "Sherd.ColorExt",
+        "Sherd.ColorInt",
+        "Sherd.ColorCore",
+        "Sherd.InclusionOther",
+        "Sherd.DomInclusion",
+        "Sherd.DomInclusionOther",
+        "Sherd.InclusionSorting",
+        "Sherd.InclusionShape",
+        "Sherd.InclusionDensity",
+        "Sherd.InclusionSize",
+        "Sherd.InclusionLargestSize",
+        "Sherd.InclusionTexture",
+    ],
+    "derived": ["SherdDerived.geo_field", "SherdDerived.Production"],
+}
+
+# Tables that can be joined onto Sherd, in join order, with the tables each join depends on
+_ARTIFACT_JOINS = [
+    ("Field", "LEFT JOIN Field ON Sherd.FieldId=Field.FieldId", []),
+    (
+        "FabricType",
+        "LEFT JOIN FabricType ON Sherd.FabricType=FabricType.FabricTypeId",
+        [],
+    ),
+    (
+        "SurveyPoint",
+        "LEFT JOIN SurveyPoint ON SurveyPoint.SurveyPointId = Sherd.SurveyPointId",
+        [],
+    ),
+    (
+        "Surveyor",
+        "LEFT JOIN Surveyor ON SurveyPoint.SurveyorId=Surveyor.SurveyorId",
+        ["SurveyPoint"],
+    ),
+    (
+        "ManufactureMethod",
+        "LEFT JOIN ManufactureMethod ON Sherd.ManufactureMethod=ManufactureMethod.ManufactureID",
+        [],
+    ),
+    (
+        "SherdDerived",
+        "LEFT JOIN SherdDerived ON Sherd.SherdId=SherdDerived.SherdId",
+        [],
+    ),
+]
+
+_ALL_ARTIFACT_SECTIONS = [
+    "metrics",
+    "classify",
+    "production",
+    "tile_brick",
+    "waretypes",
+    "vesselparts",
+    "macro_fabric",
+]
+
+
+def _normalize_sections(sections):
+    """Expand 'all' and drop 'base' (which is always included) from a list of sections"""
+    if "all" in sections:
+        return list(_ALL_ARTIFACT_SECTIONS)
+    return [s for s in sections if s != "base"]
+
+
+def _artifact_joins(sql_text):
+    """Find the joins needed for every table referenced as `Table.` in `sql_text`"""
+    import re
+
+    referenced = set(re.findall(r"\b(\w+)\.", sql_text))
+    needed = set()
+    for table, _, depends_on in _ARTIFACT_JOINS:
+        if table in referenced:
+            needed.update([table] + depends_on)
+    return "\n".join(join for table, join, _ in _ARTIFACT_JOINS if table in needed)
+
+
+def _artifacts_sql(columns, clauses=()):
+    """Build a SELECT over Sherd that names only `columns` and joins only the tables they (and `clauses`) need
+
+    Returns
+    -------
+    (sql, params) : tuple of str and list
+    """
+    where, params = _where(clauses)
+    select = "SELECT " + ", ".join(columns) + "\nFROM Sherd\n"
+    sql = select + _artifact_joins(select + where) + "\n" + where
+    return sql, params
+
+
+def _artifact_columns(sections, extra_columns=()):
+    """List the source columns to select for some (normalized) sections, and the output column names"""
+    columns = list(_ARTIFACT_COLUMNS["base"])
+    for s in sections:
+        if s in _ARTIFACT_COLUMNS:
+            columns += _ARTIFACT_COLUMNS[s]
+    columns += [c for c in extra_columns if c not in columns]
+    cols = [c.split(".")[1] for c in columns]
+    return columns, cols
+
+
+def _sherd_subset_where(id_column, clauses):
+    """Build a WHERE clause limiting `id_column` to the sherds selected by `clauses`"""
+    if not [c for c in clauses if c is not None]:
+        return "", []
+    subquery, params = _artifacts_sql(["Sherd.SherdId"], clauses)
+    return f"WHERE {id_column} IN ({subquery})", params
+
+
+#######################################################################################################################
+
+
+@_instrumented
+def get_artifacts(
+    sections=["base"],
+    years=None,
+    include_discards=False,
+    concurrent=True,
+    sparse=True,
+    compact=False,
+    partitions=None,
+    filters=None,
+    **kwargs,
+):
+    """Load a DataFrame of artifacts
+
+    Parameters
+    ----------
+    sections : list of some set of
+        {'all', 'base', 'metrics', 'classify', 'production', 'tile_brick', 'waretypes', 'vesselparts', 'macro_fabric',
+        'derived'}
+        Sections to include in the output DataFrame. Each section refers to a group of column names. 'derived' is the
+        'geo_field' and 'Production' columns saved by `write_derived()`; it is not part of 'all'.
+    years : list
+        List of desired years; can be strings or integers
+    include_discards : bool
+        If True, return all records, even artifacts marked as Discarded.
+    concurrent : bool
+        If True, run the main query and the 'waretypes'/'vesselparts' queries at the same time on separate pooled
+        connections
+    sparse : bool
+        If True, the 'waretypes' and 'vesselparts' columns are sparse (pandas SparseDtype with fill value 0). If False,
+        they are dense integer columns.
+    compact : bool
+        If True, shrink the DataFrame with `compact_dtypes()` and print how much memory was saved
+    partitions : int, optional
+        If given, split the main query into this many SherdId ranges read at the same time over separate pooled
+        connections (see `db_query_partitioned()`). Worth it for full-history loads.
+    filters : LeiapQuery, optional
+        Further filters on field, surveyor, production or date applied in the database; see `LeiapQuery`
+    **kwargs
+        Optional arguments that are passed to get_credentials()
+
+    Returns
+    -------
+    artifacts_df : pandas DataFrame
+        DataFrame of all artifacts
+
+    Notes
+    -----
+    1. Only the columns of the requested sections are selected from the database, and tables are only joined when
+    one of their columns (or filters) needs them. Discards and `filters` are dropped by the database, so only the
+    requested rows are downloaded.
+    2. The 'waretypes' and 'vesselparts' columns count how many times each sherd is linked to each ware type or
+    vessel part; sherds with no links have 0.
+    """
+    artifacts_df = _load_artifacts(
+        sections,
+        _artifact_clauses(years, filters=filters),
+        include_discards,
+        concurrent=concurrent,
+        sparse=sparse,
+        partitions=partitions,
+        **kwargs,
+    )
+    if compact:
+        artifacts_df = compact_dtypes(artifacts_df)
+    return artifacts_df
+
+
+def _artifact_clauses(years=None, include_discards=True, filters=None):
+    """The (condition, params) clauses selecting artifacts by year, discard status and a LeiapQuery"""
+    clauses = [_year_clause("Sherd.ChangedDate", years) if years else None]
+    if include_discards is False:
+        clauses.append(_not_discarded_clause())
+    if filters is not None:
+        clauses += filters.clauses("artifacts")
+    return clauses
+
+
+def _run_queries(queries, concurrent=True, **kwargs):
+    """Run several independent queries, optionally at the same time on separate pooled connections
+
+    Parameters
+    ----------
+    queries : dict
+        Mapping of name to (query_text, params)
+    concurrent : bool
+        If True and there is more than one query, run each query in its own thread (except inside `snapshot()`,
+        where all queries share one connection)
+
+    Returns
+    -------
+    results : dict
+        Mapping of name to the DataFrame returned by `db_query()`
+    """
+    if not concurrent or len(queries) < 2 or _session_connection() is not None:
+        return {
+            name: db_query(query, params=params, **kwargs)
+            for name, (query, params) in queries.items()
+        }
+
+    from concurrent.futures import ThreadPoolExecutor
+
+    with ThreadPoolExecutor(max_workers=len(queries)) as executor:
+        futures = {
+            name: executor.submit(db_query, query, params=params, **kwargs)
+            for name, (query, params) in queries.items()
+        }
+        return {name: future.result() for name, future in futures.items()}
+
+
+def _multi_hot(pairs, cat_col, sherd_ids, rename=None, sparse=True):
+    """Build multi-hot columns from (SherdId, category) pairs, aligned to a Series of SherdIds
+
+    Each sherd gets a count for every category it is linked to, built directly as a sparse matrix instead of a dense
+    one-hot frame that is then collapsed by SherdId.
+
+    Parameters
+    ----------
+    pairs : pandas DataFrame
+        Must have 'SherdId' and `cat_col` columns; one row per link
+    cat_col : str
+        Column with the category names, which become the output column names (sorted)
+    sherd_ids : pandas Series
+        SherdIds of the output rows; its index becomes the output index
+    rename : dict, optional
+        Mapping to rename categories that would clash with other columns
+    sparse : bool
+        If True, return columns with a pandas SparseDtype (fill value 0); otherwise dense integer columns
+
+    Returns
+    -------
+    multi_hot : pandas DataFrame
+    """
+    import numpy as np
+    from scipy import sparse as sp
+
+    pairs = pairs[pairs[cat_col].notna()]
+    rows = _pd.Index(sherd_ids).get_indexer(pairs["SherdId"])
+    found = rows >= 0  # links to sherds that are not in the output (e.g. discards)
+    codes, categories = _pd.factorize(pairs[cat_col][found], sort=True)
+
+    matrix = sp.coo_matrix(
+        (np.ones(len(codes), dtype=np.int64), (rows[found], codes)),
+        shape=(len(sherd_ids), len(categories)),
+    ).tocsc()  # duplicate links are summed
+    multi_hot = _pd.DataFrame.sparse.from_spmatrix(
+        matrix,
+        index=sherd_ids.index,
+        columns=_pd.Index(categories).map(lambda c: (rename or {}).get(c, c)),
+    )
+    if not sparse:
+        multi_hot = multi_hot.sparse.to_dense()
+    return multi_hot
+
+
+def _load_artifacts(
+    sections,
+    clauses=(),
+    include_discards=False,
+    extra_columns=(),
+    concurrent=True,
+    sparse=True,
+    partitions=None,
+    **kwargs,
+):
+    """Run the get_artifacts() queries restricted by a list of (condition, params) clauses
+
+    `extra_columns` are qualified source columns (e.g. 'FabricType.FabricTypeName') kept in the output in addition to
+    those of the requested sections.
+    """
+    sections = _normalize_sections(sections)
+    columns, cols = _artifact_columns(sections, extra_columns)
+    if include_discards is False:
+        clauses = list(clauses) + [_not_discarded_clause()]
+
+    ranges = [None]
+    if partitions:
+        lo, hi = _key_bounds("SELECT SherdId FROM Sherd", "SherdId", **kwargs)
+        ranges = _key_ranges("Sherd.SherdId", lo, hi, partitions)
+    queries = {
+        ("artifacts", i): _artifacts_sql(columns, list(clauses) + [key_range])
+        for i, key_range in enumerate(ranges)
+    }
+    if "waretypes" in sections:
+        where, params = _sherd_subset_where("swt.SherdId", clauses)
+        queries["waretypes"] = (
+            """SELECT swt.SherdId, wt.WareTypeName
+               FROM SherdWareType AS swt
+               LEFT JOIN WareType AS wt ON swt.WareTypeId=wt.WareTypeId
+               """
+            + where,
+            params,
+        )
+    if "vesselparts" in sections:
+        where, params = _sherd_subset_where("svp.SherdId", clauses)
+        queries["vesselparts"] = (
+            """SELECT svp.SherdId, vp.VesselPartName
+               FROM SherdVesselPart AS svp
+               LEFT JOIN VesselPart AS vp ON svp.VesselPartId=vp.VesselPartId
+               """
+            + where,
+            params,
+        )
+    results = _run_queries(queries, concurrent, **kwargs)
+    results["artifacts"] = _concat_parts(
+        [results.pop(("artifacts", i)) for i in range(len(ranges))]
+    )
+
+    with _timed("postprocess", name="_load_artifacts") as record:
+        artifacts_df = record["result"] = _build_artifacts(
+            results, sections, cols, sparse
+        )
+    return artifacts_df
+
+
+def _build_artifacts(results, sections, cols, sparse):
+    """Add the multi-hot columns to the results of the _load_artifacts() queries"""
+    artifacts_df = results["artifacts"][cols]
+
+    if "waretypes" in sections:
+        waretypes = _multi_hot(
+            results["waretypes"],
+            "WareTypeName",
+            artifacts_df["SherdId"],
+            rename={"other": "other_waretype", "unknown": "unknown_waretype"},
+            sparse=sparse,
+        )
+        artifacts_df = _pd.concat([artifacts_df, waretypes], axis=1)
+
+    if "vesselparts" in sections:
+        vessel_parts = _multi_hot(
+            results["vesselparts"],
+            "VesselPartName",
+            artifacts_df["SherdId"],
+            rename={"other": "other_vesselpart", "unknown": "unknown_vesselpart"},
+            sparse=sparse,
+        )
+        artifacts_df = _pd.concat([artifacts_df, vessel_parts], axis=1)
+
+    return artifacts_df
+
+
+#######################################################################################################################
+
+
+def get_artifacts_chunks(
+    sections=["base"],
+    years=None,
+    include_discards=False,
+    chunksize=50000,
+    filters=None,
+    **kwargs,
+):
+    """Load artifacts as a stream of DataFrames of bounded size
+
+    Parameters
+    ----------
+    sections : list of some set of
+        {'all', 'base', 'metrics', 'classify', 'production', 'tile_brick', 'macro_fabric'}
+        Sections to include in each DataFrame; see `get_artifacts()`
+    years : list
+        List of desired years; can be strings or integers
+    include_discards : bool
+        If True, return all records, even artifacts marked as Discarded.
+    chunksize : int
+        Maximum number of artifacts read from the database for each chunk
+    filters : LeiapQuery, optional
+        Further filters applied in the database; see `LeiapQuery`
+    **kwargs
+        Optional arguments that are passed to get_credentials()
+
+    Yields
+    ------
+    artifacts_df : pandas DataFrame
+        The next chunk of artifacts, with the same columns as `get_artifacts()`
+
+    Notes
+    -----
+    The 'waretypes' and 'vesselparts' sections need every row of their tables to collapse one-hot columns by sherd,
+    so they cannot be streamed.
+    """
+    sections = _normalize_sections(sections)
+    if "waretypes" in sections or "vesselparts" in sections:
+        raise ValueError("'waretypes' and 'vesselparts' cannot be loaded in chunks")
+
+    columns, cols = _artifact_columns(sections)
+    clauses = _artifact_clauses(years, include_discards, filters)
+    query, params = _artifacts_sql(columns, clauses)
+
+    for chunk in db_query_chunks(query, chunksize, params=params, **kwargs):
+        yield chunk[cols]
+
+
+#######################################################################################################################
+
+
+def get_artifacts_simple(include_discards=False, **kwargs):
+    """Load a DataFrame of artifacts with the most typical query
+    
+    Parameters
+    ----------
+    include_discards : bool
+        If True, return all records, even artifacts marked as Discarded.
+    **kwargs
+        Optional arguments that are passed to get_credentials()
+    
+    Returns
+    -------
+    artifacts_df : pandas DataFrame
+        DataFrame of all artifacts
+
+    """
+    import warnings
+
+    warnings.warn(
+        """get_artifacts_simple() is no longer preferred. Use get_artifacts() with appropriate parameters instead.""",
+        DeprecationWarning,
+    )
+    query = """SELECT Sherd.*, FabricType.*, Field.FieldNumber, SurveyPoint.Northing, SurveyPoint.Easting, 
+                      Surveyor.SurveyorName 
+               FROM Sherd
+               LEFT JOIN Field ON Sherd.FieldId=Field.FieldId
+               LEFT JOIN FabricType ON Sherd.FabricType=FabricType.FabricTypeId
+               LEFT JOIN SurveyPoint ON SurveyPoint.SurveyPointId = Sherd.SurveyPointId
+               LEFT JOIN Surveyor ON SurveyPoint.SurveyorId=Surveyor.SurveyorId
+               LEFT JOIN ManufactureMethod ON Sherd.ManufactureMethod=ManufactureMethod.ManufactureID
+               """
+    artifacts_df = db_query(query, **kwargs)
+    if include_discards is False:
+        artifacts_df = artifacts_df[artifacts_df["FabricTypeName"] != "Discarded"]
+
+    return artifacts_df
+
+
+#######################################################################################################################
+
+
+def get_artifacts_by_year(years, discards=False, **kwargs):
+    """Load a DataFrame of artifacts with the most typical query for specified year(s)
+    
+    Parameters
+    ----------
+    years : list
+        List of desired years; can be strings or integers
+    discards : bool
+        If True, return all records, even artifacts marked as Discarded.    
+    **kwargs
+        Optional arguments that are passed to get_credentials()
+
+    Returns
+    -------
+    artifacts_df : pandas DataFrame
+        DataFrame of all artifacts for specified year(s)
+        
+    """
+    import warnings
+
+    warnings.warn(
+        """get_artifacts_by_year() is no longer preferred. Use get_artifacts() with appropriate parameters instead.""",
+        DeprecationWarning,
+    )
+    artifacts_df = get_artifacts_simple(include_discards=discards, **kwargs)
+    artifacts_df = artifacts_df[artifacts_df.ChangedDate.dt.year.isin(years)]
+    return artifacts_df
+
+
+#######################################################################################################################
+
+
+@_instrumented
+def get_productions_simple(compact=False, **kwargs):
+    """Load a DataFrame of productions with the most typical query
+
+    Parameters
+    ----------
+    compact : bool
+        If True, shrink the DataFrame with `compact_dtypes()` and print how much memory was saved
+    **kwargs
+        Optional arguments that are passed to get_credentials()
+
+    Returns
+    -------
+    prods_df : pandas DataFrame
+        DataFrame of all productions
+    """
+    query = """SELECT *
+               FROM FabricType
+               """
+    prods_df = db_query(query, **kwargs)
+    if compact:
+        prods_df = compact_dtypes(prods_df)
+    return prods_df
+
+
+#######################################################################################################################
+
+
+def _assign_production(artifacts):
+    """Add a 'Production' column to artifacts, falling back to material and tile type for non-vessel artifacts"""
+    artifacts = artifacts.copy()
+
+    # For artifacts without a Production (i.e., tiles, bricks, etc), use their MaterialType as their Production. If
+    # MaterialType is Tile, use TileType ('Tegula' or 'Imbrex')
+    artifacts["Production"] = artifacts["FabricTypeName"].where(
+        ~artifacts["FabricTypeName"].isnull(),
+        artifacts["MaterialTypeName"].where(
+            artifacts["TileType"].isnull(), artifacts["TileType"]
+        ),
+    )
+
+    artifacts["Production"] = artifacts["Production"].where(
+        ~(
+            (artifacts.Note.str.contains("signinum"))
+            | (artifacts.Note.str.contains("Signinum"))
+        ),
+        "Opus signinum",
+    )
+    return artifacts
+
+
+# SQL equivalent of _assign_production()
+_PRODUCTION_SQL = """CASE WHEN Sherd.Note LIKE '%signinum%' OR Sherd.Note LIKE '%Signinum%' THEN 'Opus signinum'
+                     WHEN FabricType.FabricTypeName IS NOT NULL THEN FabricType.FabricTypeName
+                     WHEN Sherd.TileType IS NOT NULL THEN Sherd.TileType
+                     ELSE Sherd.MaterialTypeName END"""
+
+
+def _not_discarded_clause():
+    """WHERE condition dropping artifacts marked as Discarded (artifacts without a FabricType are kept)"""
+    return (
+        "(FabricType.FabricTypeName IS NULL OR FabricType.FabricTypeName <> ?)",
+        ["Discarded"],
+    )
+
+
+def _production_cts_wts_sql(clauses=()):
+    """Build a query returning the artifact count ('n') and total 'Weight' for every point and production
+
+    Returns
+    -------
+    (sql, params) : tuple of str and list
+    """
+    labelled, params = _artifacts_sql(
+        [
+            "Sherd.SurveyPointId",
+            f"{_PRODUCTION_SQL} AS Production",
+            "Sherd.Weight",
+        ],
+        [_not_discarded_clause()] + list(clauses),
+    )
+    sql = f"""SELECT a.SurveyPointId, a.Production, COUNT(*) AS n, SUM(a.Weight) AS Weight
+              FROM ({labelled}) AS a
+              WHERE a.Production IS NOT NULL
+              GROUP BY a.SurveyPointId, a.Production
+              """
+    return sql, params
+
+
+#######################################################################################################################
+
+
+@_instrumented
+def get_production_cts_wts(chunksize=None, server_side=False, dataset=None, **kwargs):
+    """Load a DataFrame of all points with columns for counts and weights of all productions
+
+    Parameters
+    ----------
+    chunksize : int, optional
+        If given, read the artifacts in chunks of this many rows and summarize each chunk as it arrives, so that
+        memory use does not grow with the size of the Sherd table
+    server_side : bool
+        If True, count and sum weights by point and production with a GROUP BY in the database and only download the
+        summary table. `chunksize` is ignored.
+    dataset : LeiapDataset, optional
+        Use the points and artifacts of a dataset from `load_dataset()` instead of querying the database. Its
+        artifacts must include the 'metrics', 'classify', 'production' and 'tile_brick' sections.
+    **kwargs
+        Optional arguments that are passed to get_credentials()
+
+    Returns
+    -------
+    cts_wts : pandas DataFrame
+        DataFrame of all points with counts and weights for all productions
+        
+    Notes
+    -----
+    1. Also pulls in some non-vessel artifact types (e.g., tile, brick, other construction material)
+    2. With `server_side=True`, the match on 'signinum' in the `Note` column follows the database collation, which is
+    usually case-insensitive.
+    """
+    if dataset is not None:
+        dataset.require_sections(["metrics", "classify", "production", "tile_brick"])
+        art_cts = (
+            _assign_production(dataset.kept_artifacts())
+            .groupby(["SurveyPointId", "Production"])
+            .agg({"Production": "size", "Weight": "sum"})
+            .unstack()
+        )
+    elif server_side:
+        query, params = _production_cts_wts_sql()
+        art_cts = (
+            db_query(query, params=params, **kwargs)
+            .set_index(["SurveyPointId", "Production"])
+            .rename(columns={"n": "Production"})
+            .fillna({"Weight": 0})  # SUM of only NULLs is NULL in SQL but 0 in pandas
+            .unstack()
+        )
+    else:
+        sections = ["metrics", "classify", "production", "tile_brick"]
+        if chunksize is None:
+            chunks = [get_artifacts(sections=sections, **kwargs)]
+        else:
+            chunks = get_artifacts_chunks(
+                sections=sections, chunksize=chunksize, **kwargs
+            )
+
+        # summarize artifacts by point, one chunk at a time
+        partials = []
+        for artifacts in chunks:
+            artifacts = _assign_production(artifacts)
+            partials.append(
+                artifacts.groupby(["SurveyPointId", "Production"]).agg(
+                    {"Production": "size", "Weight": "sum"}
+                )
+            )
+        art_cts = _pd.concat(partials).groupby(level=[0, 1]).sum().unstack()
+
+    points = get_points(**kwargs) if dataset is None else dataset.points
+
+    # merge Production (counts) and Weight (weights) with the points df
+    # do this in two steps so that we can append the _ct and _wt suffixes to columns
+    cts = _pd.merge(
+        points,
+        art_cts["Production"],
+        how="left",
+        left_on="SurveyPointId",
+        right_index=True,
+    )
+    cts_wts = _pd.merge(
+        cts,
+        art_cts["Weight"],
+        how="left",
+        left_on="SurveyPointId",
+        right_index=True,
+        suffixes=("_ct", "_wt"),
+    )
+    return cts_wts
+
+
+#######################################################################################################################
+
+
+@_instrumented
+def get_points_times(warn="enable", dataset=None, **kwargs):
+    """Load a DataFrame of points with datetimes cleaned and search times calculated
+    
+    Parameters
+    ----------
+    warn : {'enable', 'disable'}
+        Argument passed to the `calc_search_time()` function specifying whether or to print a generic warning message.
+    dataset : LeiapDataset, optional
+        Use the points of a dataset from `load_dataset()` instead of querying the database
+    **kwargs
+        Optional arguments that are passed to get_credentials()
+    
+    Returns
+    -------
+    pts : pandas DataFrame
+        DataFrame of all points with adjusted datetimes and search times
+    """
+    points = get_points(**kwargs) if dataset is None else dataset.points
+    pts = calc_search_time(clean_datetimes(points, copy=dataset is not None), warn=warn)
+    return pts
+
+
+#######################################################################################################################
+
+
+class LeiapDataset:
+    """Points, artifacts, productions and lookup tables loaded together by `load_dataset()`
+
+    Attributes
+    ----------
+    points : pandas DataFrame
+        Same as `get_points()`
+    artifacts : pandas DataFrame
+        Same as `get_artifacts()` for the sections that were loaded
+    include_discards : bool
+        Whether `artifacts` includes the artifacts marked as Discarded
+    productions : pandas DataFrame
+        Same as `get_productions_simple()`
+    lookups : dict of pandas DataFrames
+        Small lookup tables keyed by table name (e.g. 'Field', 'Surveyor', 'WareType')
+    sections : list
+        Artifact sections that were loaded
+    loaded_at : datetime
+        When the snapshot was taken
+    point_index, artifact_index : pandas Index
+        Indexes of `SurveyPointId` and `SherdId`, in row order, for fast lookups
+
+    Notes
+    -----
+    Pass the dataset to functions that accept a `dataset` argument (e.g. `get_production_cts_wts()`,
+    `get_points_times()`, `check_all()`) to reuse it instead of querying the database again. Those functions leave
+    out discards, as their database queries do, using `kept_artifacts()`.
+    """
+
+    def __init__(
+        self,
+        points,
+        artifacts,
+        productions,
+        lookups,
+        sections,
+        loaded_at,
+        include_discards=False,
+    ):
+        self.points = points
+        self.artifacts = artifacts
+        self.include_discards = include_discards
+        self.productions = productions
+        self.lookups = lookups
+        self.sections = sections
+        self.loaded_at = loaded_at
+        self.point_index = _pd.Index(points["SurveyPointId"])
+        self.artifact_index = _pd.Index(artifacts["SherdId"])
+        self._artifact_rows_by_point = None
+
+    def __repr__(self):
+        return (
+            f"<LeiapDataset: {len(self.points)} points, "
+            f"{len(self.artifacts)} artifacts, {len(self.productions)} productions, "
+            f"loaded {self.loaded_at:%Y-%m-%d %H:%M}>"
+        )
+
+    def get_points(self, ids):
+        """Rows of `points` for some SurveyPointIds, in the order given; raises a KeyError for unknown ids"""
+        return self.points.iloc[_positions(self.point_index, ids, "SurveyPointIds")]
+
+    def get_artifacts(self, ids):
+        """Rows of `artifacts` for some SherdIds, in the order given; raises a KeyError for unknown ids"""
+        return self.artifacts.iloc[_positions(self.artifact_index, ids, "SherdIds")]
+
+    def artifacts_at(self, point_ids):
+        """All artifacts found at some SurveyPointIds"""
+        import numpy as np
+
+        if self._artifact_rows_by_point is None:
+            by_point = self.artifacts.groupby("SurveyPointId")
+            self._artifact_rows_by_point = by_point.indices
+        rows = [
+            self._artifact_rows_by_point[i]
+            for i in point_ids
+            if i in self._artifact_rows_by_point
+        ]
+        return self.artifacts.iloc[np.concatenate(rows) if rows else []]
+
+    def kept_artifacts(self):
+        """`artifacts` without those marked as Discarded; raises a ValueError if they cannot be told apart"""
+        if not self.include_discards:
+            return self.artifacts
+        if "FabricTypeName" not in self.artifacts.columns:
+            raise ValueError(
+                "The dataset includes discards but was loaded without the 'classify' "
+                "section, so they cannot be left out"
+            )
+        return self.artifacts[self.artifacts["FabricTypeName"] != "Discarded"]
+
+    def require_sections(self, sections):
+        """Raise a ValueError unless the artifacts include every one of `sections`"""
+        missing = set(_normalize_sections(sections)) - set(self.sections)
+        if missing:
+            raise ValueError(
+                "The dataset was loaded without the artifact sections "
+                f"{sorted(missing)}"
+            )
+
+
+def _positions(index, ids, name):
+    """Row positions of `ids` in `index`, raising a KeyError for ids that are not in it"""
+    import numpy as np
+
+    rows = index.get_indexer(ids)
+    if (rows < 0).any():
+        missing = np.asarray(ids)[rows < 0].tolist()
+        raise KeyError(f"{name} not in the dataset: {missing}")
+    return rows
+
+
+# Lookup tables loaded by load_dataset()
+_LOOKUP_TABLES = ["Field", "Surveyor", "WareType", "VesselPart", "ManufactureMethod"]
+
+
+@_instrumented
+def load_dataset(sections=["all"], years=None, include_discards=False, **kwargs):
+    """Load points, artifacts, productions and lookup tables from one consistent snapshot of the database
+
+    Parameters
+    ----------
+    sections : list
+        Artifact sections to include; see `get_artifacts()`
+    years : list
+        List of desired years; can be strings or integers
+    include_discards : bool
+        If True, return all records, even artifacts marked as Discarded.
+    **kwargs
+        Optional arguments that are passed to get_credentials()
+
+    Returns
+    -------
+    dataset : LeiapDataset
+
+    Notes
+    -----
+    All tables are read in one `snapshot()` transaction on a single connection, so they agree with each other even
+    while data entry is going on.
+
+    Examples
+    --------
+    >>> data = load_dataset()
+    >>> cts_wts = get_production_cts_wts(dataset=data)
+    >>> checks = check_all(dataset=data)
+    """
+    import datetime
+
+    sections = _normalize_sections(sections)
+    with snapshot(**kwargs):
+        loaded_at = datetime.datetime.now()
+        points = get_points(years=years, **kwargs)
+        artifacts = get_artifacts(
+            sections=sections, years=years, include_discards=include_discards, **kwargs
+        )
+        productions = get_productions_simple(**kwargs)
+        lookups = {
+            table: db_query(f"SELECT * FROM {table}", **kwargs)
+            for table in _LOOKUP_TABLES
+        }
+
+    return LeiapDataset(
+        points,
+        artifacts,
+        productions,
+        lookups,
+        sections,
+        loaded_at,
+        include_discards=include_discards,
+    )
+
+
+#######################################################################################################################
+
+
+_cache_settings = {
+    "dir": _os.environ.get(
+        "LEIAP_CACHE_DIR", _os.path.join(_os.path.expanduser("~"), ".leiap", "cache")
+    )
+}
+
+# Tables each cacheable loader reads; a change to any of them invalidates the loader's cache entries
+_CACHE_SOURCES = {
+    "get_points": ["SurveyPoint", "Field", "Surveyor"],
+    "get_artifacts": [
+        "Sherd",
+        "Field",
+        "FabricType",
+        "SurveyPoint",
+        "Surveyor",
+        "ManufactureMethod",
+    ],
+    "get_productions_simple": ["FabricType"],
+}
+
+# Extra tables read for some loader arguments
+_CACHE_SECTION_SOURCES = {
+    "derived": {
+        "get_points": ["SurveyPointDerived"],
+        "get_artifacts": ["SherdDerived"],
+    },
+    "waretypes": {"get_artifacts": ["SherdWareType", "WareType"]},
+    "vesselparts": {"get_artifacts": ["SherdVesselPart", "VesselPart"]},
+}
+
+
+def set_cache_dir(path):
+    """Set the directory where cached query results are stored
+
+    Parameters
+    ----------
+    path : str
+        Directory for the cache files; created on first write if it does not exist
+
+    Notes
+    -----
+    The default is the `LEIAP_CACHE_DIR` environment variable, or `~/.leiap/cache` if that is not set.
+    """
+    _cache_settings["dir"] = str(path)
+
+
+def get_cache_dir():
+    """Get the directory where cached query results are stored
+
+    Returns
+    -------
+    path : str
+    """
+    return _cache_settings["dir"]
+
+
+#######################################################################################################################
+
+
+def _loader_name(loader):
+    return loader if isinstance(loader, str) else loader.__name__
+
+
+def _cache_key(name, params):
+    """Build a stable file name for a loader and its parameters"""
+    import hashlib
+    import json
+
+    params = dict(params)
+    if "sections" in params:
+        params["sections"] = sorted(_normalize_sections(params["sections"]))
+    if params.get("years"):
+        params["years"] = sorted({int(year) for year in params["years"]})
+    digest = hashlib.sha1(
+        json.dumps(params, sort_keys=True, default=str).encode()
+    ).hexdigest()
+    return f"{name}-{digest[:16]}"
+
+
+def _cache_sources(name, params):
+    """List every table a loader reads with the given arguments"""
+    tables = list(_CACHE_SOURCES[name])
+    sections = _normalize_sections(params.get("sections", []))
+    if params.get("derived"):
+        sections.append("derived")
+    for section in sections:
+        tables += _CACHE_SECTION_SOURCES.get(section, {}).get(name, [])
+    return tables
+
+
+def _source_fingerprint(name, params, **kwargs):
+    """Summarize the current state of every table a loader reads as a JSON-friendly list"""
+    credentials = {
+        k: v for k, v in kwargs.items() if k in ("driver", "credentials_path")
+    }
+    backend = _backend["current"]
+    return backend.fingerprint(_cache_sources(name, params), **credentials)
+
+
+def _read_cache_entry(path):
+    """Read a cached DataFrame and its metadata, or return (None, None) if there is no readable entry"""
+    import json
+    import pyarrow.parquet as pq
+
+    try:
+        table = pq.read_table(path)
+    except (FileNotFoundError, OSError):
+        return None, None
+    meta = json.loads(table.schema.metadata[b"leiap"])
+    df = table.to_pandas()
+    for col in meta.get("sparse_columns", []):
+        df[col] = df[col].astype(_pd.SparseDtype(df[col].dtype, 0))
+    return df, meta
+
+
+def _write_cache_entry(path, df, meta):
+    """Atomically write a DataFrame and its metadata to a single Parquet file
+
+    The file is written under a temporary name in the same directory and then renamed over the old entry, so other
+    processes reading the cache only ever see a complete entry.
+    """
+    import json
+    import tempfile
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    # Parquet has no sparse type, so store sparse columns densely and restore them on read
+    sparse_columns = [c for c in df.columns if isinstance(df[c].dtype, _pd.SparseDtype)]
+    if sparse_columns:
+        df = df.astype({c: df[c].sparse.to_dense().dtype for c in sparse_columns})
+        meta = dict(meta, sparse_columns=sparse_columns)
+
+    table = pa.Table.from_pandas(df)
+    table = table.replace_schema_metadata(
+        {**(table.schema.metadata or {}), b"leiap": json.dumps(meta).encode()}
+    )
+    directory = _os.path.dirname(path)
+    _os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with _os.fdopen(fd, "wb") as f:
+            pq.write_table(table, f)
+        _os.replace(tmp_path, path)
+    except PermissionError:
+        # on Windows the old entry cannot be replaced while another process is reading it; keep theirs
+        _os.remove(tmp_path)
+    except BaseException:
+        _os.remove(tmp_path)
+        raise
 
 
 #######################################################################################################################
 
 
-def db_query(query_text, **kwargs):
-    """Send any SQL query to the database
-    
+def load_cached(loader, max_age=None, check_source=True, refresh=False, **kwargs):
+    """Load points, artifacts or productions from the local cache, querying the database only when needed
+
     Parameters
     ----------
-    query_text : str
-        Full SQL query to pass to the database
+    loader : {get_points, get_artifacts, get_productions_simple} or str
+        Loader function (or its name) whose results should be cached
+    max_age : int or float, optional
+        Maximum age in seconds of a usable cache entry. If None, entries do not expire with age.
+    check_source : bool
+        If True, compare a fingerprint of every table the loader reads against the one stored with the entry and
+        reload if they differ. Set to False to work entirely offline.
+    refresh : bool
+        If True, ignore any existing entry and reload from the database
     **kwargs
-        Optional arguments that are passed to get_credentials()
+        Arguments passed to the loader (e.g., `sections`, `years`) and on to get_credentials(). Each distinct set of
+        arguments is cached separately.
 
     Returns
     -------
     df : pandas DataFrame
-        DataFrame of query results
+        Same as the loader's output
+
+    Notes
+    -----
+    Entries are Parquet files in `get_cache_dir()` and require `pyarrow`. They are replaced atomically, so several
+    processes can share a cache directory.
+
+    On SQL Server the fingerprint is the row count and `CHECKSUM_AGG(BINARY_CHECKSUM(*))` of each table, so edits to
+    existing rows (and to joined tables such as FabricType or SherdWareType) are noticed too. For a local SQLite or
+    DuckDB file it is the file's size and modification time, so any write to the file reloads the entry.
+
+    Examples
+    --------
+    >>> artifacts = load_cached(get_artifacts, sections=["metrics", "classify"], max_age=3600)
     """
-    conn = connect2db(**kwargs)
-    df = _pd.read_sql(query_text, conn)
-    conn.close()
+    import time
+
+    name = _loader_name(loader)
+    if name not in _CACHE_SOURCES:
+        raise ValueError(
+            f"Cannot cache `{name}`; choose one of {sorted(_CACHE_SOURCES)}"
+        )
+    path = _os.path.join(get_cache_dir(), _cache_key(name, kwargs) + ".parquet")
+
+    fingerprint = _source_fingerprint(name, kwargs, **kwargs) if check_source else None
+    if not refresh:
+        df, meta = _read_cache_entry(path)
+        if df is not None:
+            too_old = max_age is not None and time.time() - meta["created"] > max_age
+            changed = check_source and meta["fingerprint"] != fingerprint
+            if not too_old and not changed:
+                return df
+
+    if fingerprint is None:
+        fingerprint = _source_fingerprint(name, kwargs, **kwargs)
+    df = globals()[name](memo=False, **kwargs)
+    _write_cache_entry(
+        path, df, {"created": time.time(), "fingerprint": fingerprint, "loader": name}
+    )
     return df
 
 
 #######################################################################################################################
 
 
-def get_points(years=None, **kwargs):
-    """Load a DataFrame of points
+def invalidate_cache(loader=None):
+    """Delete cached query results so the next `load_cached()` call queries the database
 
     Parameters
     ----------
-    years : list
-        List of desired years; can be strings or integers
-    **kwargs
-        Optional arguments that are passed to get_credentials()
+    loader : function or str, optional
+        Only delete entries for this loader. If None, delete the entries of every loader `load_cached()` accepts.
 
     Returns
     -------
-    points_df : pandas DataFrame
-        DataFrame of all points
-    """
-    query = """SELECT SurveyPoint.*, Field.FieldNumber, Surveyor.SurveyorName 
-               FROM SurveyPoint 
-               LEFT JOIN Field ON SurveyPoint.FieldId=Field.FieldId
-               LEFT JOIN Surveyor ON SurveyPoint.SurveyorId=Surveyor.SurveyorId
-               """
-    points_df = db_query(query, **kwargs)
-    points_df = points_df.drop(columns=["SherdCount", "tempFixIDs"])
+    n : int
+        Number of entries deleted
 
-    if years:
-        points_df = points_df[points_df.DataDate.dt.year.isin(years)]
+    Notes
+    -----
+    The local stores of `sync_points()` and `sync_artifacts()` (in the 'sync' subdirectory of `get_cache_dir()`) and
+    the fields of `load_fields()` are not touched. To reset a sync store, call its function with `full=True`.
+    """
+    import glob
 
-    return points_df
+    names = sorted(_CACHE_SOURCES) if loader is None else [_loader_name(loader)]
+    n = 0
+    for name in names:
+        for path in glob.glob(_os.path.join(get_cache_dir(), f"{name}-*.parquet")):
+            try:
+                _os.remove(path)
+                n += 1
+            except FileNotFoundError:  # removed by another process
+                pass
+    return n
 
 
 #######################################################################################################################
 
 
-def get_points_simple(**kwargs):
-    """Load a DataFrame of points with the most typical query
-
-    Parameters
-    ----------
-    **kwargs
-        Optional arguments that are passed to get_credentials()
-
-    Returns
-    -------
-    points_df : pandas DataFrame
-        DataFrame of all points
-    """
-    import warnings
+def _sync(store_name, load, id_col, watermark_col, full, params):
+    """Bring a local store up to date by loading rows at or after its high-water mark and upserting them by id"""
+    import datetime
 
-    warnings.warn(
-        """get_points_simple() is no longer preferred. Use get_points() with appropriate parameters instead.""",
-        DeprecationWarning,
+    # in their own subdirectory, so invalidate_cache() never throws away a store
+    path = _os.path.join(
+        get_cache_dir(), "sync", _cache_key(store_name, params) + ".parquet"
     )
+    store, meta = (None, None) if full else _read_cache_entry(path)
+
+    if store is None or meta.get("watermark") is None:
+        merged = load([])
+    else:
+        # `>=` rather than `>` so rows sharing the watermark's timestamp are not missed; the upsert dedupes them
+        watermark = _pd.Timestamp(meta["watermark"]).to_pydatetime()
+        new = load([(f"{watermark_col} >= ?", [watermark])])
+        kept = store[~store[id_col].isin(new[id_col])]
+        merged = _pd.concat([kept, new], sort=False)
+        # multi-hot columns missing from one side come back as NaN; they mean "no link"
+        for col in merged.columns:
+            if any(
+                col in df.columns and isinstance(df[col].dtype, _pd.SparseDtype)
+                for df in (kept, new)
+            ):
+                dense = merged[col].astype(float).fillna(0).astype("int64")
+                merged[col] = dense.astype(_pd.SparseDtype("int64", 0))
+        merged = _drop_empty_multi_hot(merged)
+
+    merged = merged.sort_values(id_col).reset_index(drop=True)
+    watermark = merged[watermark_col.split(".")[1]].max()
+    _write_cache_entry(
+        path,
+        merged,
+        {
+            "created": datetime.datetime.now().timestamp(),
+            "watermark": None if _pd.isna(watermark) else str(watermark),
+            "loader": store_name,
+        },
+    )
+    return merged
 
-    query = """SELECT SurveyPoint.*, Field.FieldNumber, Surveyor.SurveyorName 
-               FROM SurveyPoint 
-               LEFT JOIN Field ON SurveyPoint.FieldId=Field.FieldId
-               LEFT JOIN Surveyor ON SurveyPoint.SurveyorId=Surveyor.SurveyorId
-               """
-    points_df = db_query(query, **kwargs)
-    return points_df
+
+def _drop_empty_multi_hot(df):
+    """Drop multi-hot columns whose category is no longer linked to any row, as a fresh load would not have them"""
+    empty = [
+        col
+        for col in df.columns
+        if isinstance(df[col].dtype, _pd.SparseDtype) and not df[col].any()
+    ]
+    return df.drop(columns=empty)
 
 
 #######################################################################################################################
 
 
-def get_points_by_year(years, **kwargs):
-    """Load a DataFrame of points with the most typical query for specified year(s)
+@_instrumented
+def sync_points(full=False, **kwargs):
+    """Load all points, downloading only the rows entered since the last sync
 
     Parameters
     ----------
-    years : list
-        List of desired years; can be strings or integers
+    full : bool
+        If True, discard the local store and download every point again
     **kwargs
         Optional arguments that are passed to get_credentials()
 
     Returns
     -------
     points_df : pandas DataFrame
-        DataFrame of all points for specified year(s)
-    """
-    import warnings
+        Same as `get_points()`, sorted by SurveyPointId
 
-    warnings.warn(
-        """get_points_by_year() is no longer preferred. Use get_points() with appropriate parameters instead.""",
-        DeprecationWarning,
+    Notes
+    -----
+    The local store lives in the 'sync' subdirectory of `get_cache_dir()`; `invalidate_cache()` does not delete it,
+    so use `full=True` to start over. The high-water mark is the latest `EnteredDate` rather than
+    `DataDate`, because GPS points are often uploaded days after they were recorded. Rows deleted from the database
+    are only removed from the store by a `full=True` sync, and edits to points already in the store (e.g. a
+    coordinate fix) are only picked up if they also move `EnteredDate` forward.
+    """
+    return _sync(
+        "sync_points",
+        lambda clauses: _load_points(clauses, memo=False, **kwargs),
+        id_col="SurveyPointId",
+        watermark_col="SurveyPoint.EnteredDate",
+        full=full,
+        params=kwargs,
     )
 
-    points_df = get_points_simple(**kwargs)
-    points_df = points_df[points_df.DataDate.dt.year.isin(years)]
-    return points_df
-
 
 #######################################################################################################################
 
 
-def get_artifacts(sections=["base"], years=None, include_discards=False, **kwargs):
-    """Load a DataFrame of artifacts
+@_instrumented
+def sync_artifacts(sections=["base"], include_discards=False, full=False, **kwargs):
+    """Load all artifacts, downloading only the rows changed since the last sync
 
     Parameters
     ----------
-    sections : list of some set of
-        {'all', 'base', 'metrics', 'classify', 'production', 'tile_brick', 'waretypes', 'vesselparts', 'macro_fabric'}
-        Sections to include in the output DataFrame. Each section refers to a group of column names.
-    years : list
-        List of desired years; can be strings or integers
+    sections : list
+        Sections to include in the output DataFrame; see `get_artifacts()`. Each set of sections has its own store.
     include_discards : bool
         If True, return all records, even artifacts marked as Discarded.
+    full : bool
+        If True, discard the local store and download every artifact again
     **kwargs
         Optional arguments that are passed to get_credentials()
 
     Returns
     -------
     artifacts_df : pandas DataFrame
-        DataFrame of all artifacts
+        Same as `get_artifacts()`, sorted by SherdId. Multi-hot columns of categories that first appeared after the
+        last full sync come after the other multi-hot columns instead of in alphabetical order.
 
+    Notes
+    -----
+    The local store lives in the 'sync' subdirectory of `get_cache_dir()` (use `full=True` to start over) and uses
+    the latest `Sherd.ChangedDate` as its high-water mark.
+    Discarded artifacts are kept in the store so that a sherd which is later marked as Discarded replaces its old
+    row. Rows deleted from the database are only removed from the store by a `full=True` sync.
+
+    Only sherds whose `ChangedDate` moved are downloaded again, so edits to other tables that do not touch the Sherd
+    row are missed until a `full=True` sync. This includes added or removed ware-type and vessel-part links
+    (SherdWareType, SherdVesselPart) and changes to FabricType (e.g. a production renamed to Discarded),
+    SurveyPoint coordinates, or names in the lookup tables.
     """
-    if "base" in sections:
-        sections.remove("base")
-    if "all" in sections:
-        sections = [
-            "metrics",
-            "classify",
-            "production",
-            "tile_brick",
-            "waretypes",
-            "vesselparts",
-            "macro_fabric",
-        ]
-
-    base = [
-        "SherdId",
-        "FieldId",
-        "SurveyorId",
-        "PointId",
-        "SherdNum",
-        "SurveyPointId",
-        "ChangedDate",
-        "FieldNumber",
-        "Northing",
-        "Easting",
-        "SurveyorName",
-    ]
-
-    col_grps = {
-        "metrics": ["Length", "Width", "Thickness", "Weight"],
-        "classify": [
-            "MaterialTypeName",
-            "ManufactureName",
-            "FabricTypeName",
-            "Form",
-            "Note",
-            "VesselPartOther",
-            "WareTypeOther",
-        ],
-        "production": [
-            "Chronology",
-            "CultureOther",
-            "RegionOther",
-            "EnteredDate",
-            "EarlyChrono",
-            "LateChrono",
-            "Catalan",
-        ],
-        "tile_brick": ["TileType", "TileIsStamped", "TileIsCurved", "BrickIsStamped"],
-        "macro_fabric": [
-            "SherdCondition",
-            "SurfaceTexture",
-            "SurfTextureOther",
-            "SurfaceCondition",
-            "SurvCondOther",
-            "SurfaceTreatExt",
-            "STEOther",
-            "SurfaceTreatInt",
-            "STIOther",
-            "HardnessSurface",
-            "HardnessCore",
-            "FiringCore",
-            "ColorExt",
-            "ColorInt",
-            "ColorCore",
-            "InclusionOther",
-            "DomInclusion",
-            "DomInclusionOther",
-            "InclusionSorting",
-            "InclusionShape",
-            "InclusionDensity",
-            "InclusionSize",
-            "InclusionLargestSize",
-            "InclusionTexture",
-        ],
-    }
+    sections = _normalize_sections(sections)
+    fabric_type = "FabricType.FabricTypeName"
+    has_fabric_type = any(
+        fabric_type in _ARTIFACT_COLUMNS.get(s, []) for s in sections
+    )
 
-    query = """SELECT Sherd.*, FabricType.*, Field.FieldNumber, SurveyPoint.Northing, SurveyPoint.Easting, 
-                      Surveyor.SurveyorName, ManufactureMethod.ManufactureName
-               FROM Sherd
-               LEFT JOIN Field ON Sherd.FieldId=Field.FieldId
-               LEFT JOIN FabricType ON Sherd.FabricType=FabricType.FabricTypeId
-               LEFT JOIN SurveyPoint ON SurveyPoint.SurveyPointId = Sherd.SurveyPointId
-               LEFT JOIN Surveyor ON SurveyPoint.SurveyorId=Surveyor.SurveyorId
-               LEFT JOIN ManufactureMethod ON Sherd.ManufactureMethod=ManufactureMethod.ManufactureID
-               """
-    artifacts_df = db_query(query, **kwargs)
+    artifacts_df = _sync(
+        "sync_artifacts",
+        lambda clauses: _load_artifacts(
+            sections,
+            clauses,
+            include_discards=True,
+            extra_columns=[fabric_type],
+            memo=False,
+            **kwargs,
+        ),
+        id_col="SherdId",
+        watermark_col="Sherd.ChangedDate",
+        full=full,
+        params=dict(kwargs, sections=sections),
+    )
 
     if include_discards is False:
         artifacts_df = artifacts_df[artifacts_df["FabricTypeName"] != "Discarded"]
-
-    cols = base
-    for s in sections:
-        if s in col_grps.keys():
-            cols += col_grps[s]
-
-    artifacts_df = artifacts_df[cols]
-
-    if "waretypes" in sections:
-        waretypes = db_query(
-            """SELECT swt.SherdId, wt.WareTypeName
-                                     FROM SherdWareType AS swt
-                                     LEFT JOIN WareType AS wt ON swt.WareTypeId=wt.WareTypeId
-                                     LEFT JOIN Sherd ON Sherd.SherdId=swt.SherdId
-                                     """
-        )
-
-        dummies = _pd.get_dummies(waretypes["WareTypeName"]).rename(  # one hot encoding
-            columns={"other": "other_waretype", "unknown": "unknown_waretype"}
-        )
-        waretypes = waretypes.merge(
-            dummies, how="left", left_index=True, right_index=True
-        )  # attach to original
-        waretypes = waretypes.groupby(
-            "SherdId"
-        ).sum()  # groupby to collapse duplicate SherdIds
-        artifacts_df = artifacts_df.merge(
-            waretypes, how="left", left_on="SherdId", right_index=True
-        )  # merge with df
-
-    if "vesselparts" in sections:
-        vessel_parts = db_query(
-            """SELECT svp.SherdId, vp.VesselPartName
-                                     FROM SherdVesselPart AS svp
-                                     LEFT JOIN VesselPart AS vp ON svp.VesselPartId=vp.VesselPartId
-                                     LEFT JOIN Sherd ON Sherd.SherdId=svp.SherdId
-                                     """
-        )
-
-        dummies = _pd.get_dummies(vessel_parts["VesselPartName"]).rename(
-            columns={"other": "other_vesselpart", "unknown": "unknown_vesselpart"}
-        )  # one hot encoding
-        vessel_parts = vessel_parts.merge(
-            dummies, how="left", left_index=True, right_index=True
-        )  # attach to original
-        vessel_parts = vessel_parts.groupby(
-            "SherdId"
-        ).sum()  # groupby to collapse duplicate SherdIds
-        artifacts_df = artifacts_df.merge(
-            vessel_parts, how="left", left_on="SherdId", right_index=True
-        )  # merge with df
-
-    if years:
-        artifacts_df = artifacts_df[artifacts_df.ChangedDate.dt.year.isin(years)]
+        artifacts_df = _drop_empty_multi_hot(artifacts_df).reset_index(drop=True)
+    if not has_fabric_type:
+        artifacts_df = artifacts_df.drop(columns=["FabricTypeName"])
 
     return artifacts_df
 
@@ -365,189 +2940,210 @@ def get_artifacts(sections=["base"], years=None, include_discards=False, **kwarg
 #######################################################################################################################
 
 
-def get_artifacts_simple(include_discards=False, **kwargs):
-    """Load a DataFrame of artifacts with the most typical query
-    
+# Tables of the project schema (see docs/db.rst)
+_PROJECT_TABLES = [
+    "SurveyPoint",
+    "Sherd",
+    "Field",
+    "Surveyor",
+    "FabricType",
+    "ManufactureMethod",
+    "WareType",
+    "SherdWareType",
+    "VesselPart",
+    "SherdVesselPart",
+    "Culture",
+    "FabricTypeCulture",
+    "Region",
+    "FabricTypeRegion",
+    "LandCondition",
+    "GroundCover",
+    "LandUse",
+]
+
+
+def write_local_db(path, tables, backend="sqlite"):
+    """Write DataFrames as tables of a local SQLite or DuckDB file, replacing tables that already exist
+
     Parameters
     ----------
-    include_discards : bool
-        If True, return all records, even artifacts marked as Discarded.
-    **kwargs
-        Optional arguments that are passed to get_credentials()
-    
-    Returns
-    -------
-    artifacts_df : pandas DataFrame
-        DataFrame of all artifacts
-
+    path : str
+        Location of the local database file; created if it does not exist
+    tables : dict
+        Mapping of table name to pandas DataFrame
+    backend : {'sqlite', 'duckdb'}
+        Type of database file
     """
-    import warnings
-
-    warnings.warn(
-        """get_artifacts_simple() is no longer preferred. Use get_artifacts() with appropriate parameters instead.""",
-        DeprecationWarning,
-    )
-    query = """SELECT Sherd.*, FabricType.*, Field.FieldNumber, SurveyPoint.Northing, SurveyPoint.Easting, 
-                      Surveyor.SurveyorName 
-               FROM Sherd
-               LEFT JOIN Field ON Sherd.FieldId=Field.FieldId
-               LEFT JOIN FabricType ON Sherd.FabricType=FabricType.FabricTypeId
-               LEFT JOIN SurveyPoint ON SurveyPoint.SurveyPointId = Sherd.SurveyPointId
-               LEFT JOIN Surveyor ON SurveyPoint.SurveyorId=Surveyor.SurveyorId
-               LEFT JOIN ManufactureMethod ON Sherd.ManufactureMethod=ManufactureMethod.ManufactureID
-               """
-    artifacts_df = db_query(query, **kwargs)
-    if include_discards is False:
-        artifacts_df = artifacts_df[artifacts_df["FabricTypeName"] != "Discarded"]
-
-    return artifacts_df
+    if backend == "sqlite":
+        conn = _SQLiteBackend(path).connect()
+        for name, df in tables.items():
+            df.to_sql(name, conn, if_exists="replace", index=False)
+    elif backend == "duckdb":
+        conn = _DuckDBBackend(path).connect()
+        for name, df in tables.items():
+            conn.register("_leiap_df", df)
+            conn.execute(f"CREATE OR REPLACE TABLE {name} AS SELECT * FROM _leiap_df")
+            conn.unregister("_leiap_df")
+    else:
+        raise ValueError("`backend` must be 'sqlite' or 'duckdb'")
+    conn.commit()
+    conn.close()
+    clear_cache()
 
 
 #######################################################################################################################
 
 
-def get_artifacts_by_year(years, discards=False, **kwargs):
-    """Load a DataFrame of artifacts with the most typical query for specified year(s)
-    
+def export_local_db(path, backend="sqlite", tables=None, **kwargs):
+    """Copy the project tables from the current database into a local SQLite or DuckDB file for offline use
+
     Parameters
     ----------
-    years : list
-        List of desired years; can be strings or integers
-    discards : bool
-        If True, return all records, even artifacts marked as Discarded.    
+    path : str
+        Location of the local database file
+    backend : {'sqlite', 'duckdb'}
+        Type of database file to write
+    tables : list of str, optional
+        Tables to copy; defaults to all tables of the project schema
     **kwargs
         Optional arguments that are passed to get_credentials()
 
     Returns
     -------
-    artifacts_df : pandas DataFrame
-        DataFrame of all artifacts for specified year(s)
-        
-    """
-    import warnings
+    path : str
 
-    warnings.warn(
-        """get_artifacts_by_year() is no longer preferred. Use get_artifacts() with appropriate parameters instead.""",
-        DeprecationWarning,
+    Examples
+    --------
+    >>> export_local_db("leiap.duckdb", backend="duckdb")
+    >>> use_backend("duckdb", "leiap.duckdb")
+    """
+    tables = _PROJECT_TABLES if tables is None else tables
+    frames = _run_queries(
+        {name: (f"SELECT * FROM {name}", None) for name in tables}, **kwargs
     )
-    artifacts_df = get_artifacts_simple(include_discards=discards, **kwargs)
-    artifacts_df = artifacts_df[artifacts_df.ChangedDate.dt.year.isin(years)]
-    return artifacts_df
+    write_local_db(path, frames, backend=backend)
+    return path
 
 
 #######################################################################################################################
 
 
-def get_productions_simple(**kwargs):
-    """Load a DataFrame of productions with the most typical query
+# Tables holding columns computed client-side: table -> (key column, {column: type})
+_DERIVED_TABLES = {
+    "SurveyPointDerived": (
+        "SurveyPointId",
+        {
+            "geo_field": "text",
+            "dt_adj": "datetime",
+            "search_time": "float",
+            "dist": "float",
+        },
+    ),
+    "SherdDerived": ("SherdId", {"geo_field": "text", "Production": "text"}),
+}
+
+
+def write_derived(df, table, columns=None, batch_size=10000, **kwargs):
+    """Save columns computed client-side to the database so later loads can join them instead of recomputing
 
     Parameters
     ----------
+    df : pandas DataFrame
+        Points (for 'SurveyPointDerived') or artifacts (for 'SherdDerived') with the columns to save
+    table : {'SurveyPointDerived', 'SherdDerived'}
+        Table to write to; it is created if it does not exist. 'SurveyPointDerived' holds 'geo_field', 'dt_adj',
+        'search_time' and 'dist' by SurveyPointId, and 'SherdDerived' holds 'geo_field' and 'Production' by SherdId.
+    columns : list of str, optional
+        Columns to save; defaults to every column of the table that is in `df`
+    batch_size : int
+        Number of rows sent to the database at once
     **kwargs
         Optional arguments that are passed to get_credentials()
 
     Returns
     -------
-    prods_df : pandas DataFrame
-        DataFrame of all productions
+    n : int
+        Number of rows written
+
+    Notes
+    -----
+    Rows are merged by id: saved values of the other columns are kept, and values of `columns` are replaced. On SQL
+    Server the rows are sent in batches with pyodbc's `fast_executemany` to a temporary table and merged with one
+    MERGE statement. If an id appears more than once in `df`, its last row is saved.
+
+    Load the saved columns with `get_points(derived=True)` or the 'derived' section of `get_artifacts()`.
+
+    Examples
+    --------
+    >>> pts = get_points_times()
+    >>> write_derived(pts, "SurveyPointDerived", columns=["dt_adj", "search_time", "dist"])
     """
-    query = """SELECT *
-               FROM FabricType
-               """
-    prods_df = db_query(query, **kwargs)
-    return prods_df
+    if table not in _DERIVED_TABLES:
+        raise ValueError(f"`table` must be one of {sorted(_DERIVED_TABLES)}")
+    if _session_connection() is not None:
+        raise RuntimeError("Cannot write to the database inside `snapshot()`")
+    key, types = _DERIVED_TABLES[table]
+    if columns is None:
+        columns = [c for c in types if c in df.columns]
+    unknown = [c for c in columns if c not in types]
+    if unknown:
+        raise ValueError(f"{table} has no columns {unknown}")
+    if not columns:
+        raise ValueError(f"`df` has none of the columns of {table}: {list(types)}")
+
+    rows = df[[key] + columns]
+    rows = rows[rows[key].notna()].drop_duplicates(key, keep="last")
+
+    backend = _backend["current"]
+    with pooled_connection(**kwargs) as conn:
+        with _timed("write", name=table) as record:
+            backend.create_table(conn, table, key, types)
+            backend.upsert(conn, table, key, columns, rows, batch_size)
+            conn.commit()
+            record["result"] = rows
+    clear_cache()
+    return len(rows)
 
 
 #######################################################################################################################
 
 
-def get_production_cts_wts(**kwargs):
-    """Load a DataFrame of all points with columns for counts and weights of all productions
+def update_derived(fields_shp_path=None, **kwargs):
+    """Compute the derived columns of every point and artifact and save them with `write_derived()`
 
     Parameters
     ----------
+    fields_shp_path : str, optional
+        Path to the shapefile (.shp) of the fields. If given, 'geo_field' is computed with `find_geo_field()` as well.
     **kwargs
         Optional arguments that are passed to get_credentials()
 
     Returns
     -------
-    cts_wts : pandas DataFrame
-        DataFrame of all points with counts and weights for all productions
-        
-    Notes
-    -----
-    Also pulls in some non-vessel artifact types (e.g., tile, brick, other construction material)
-    
+    n : dict
+        Number of rows written to each table
     """
-    artifacts = get_artifacts(
-        sections=["metrics", "classify", "production", "tile_brick"], **kwargs
-    )
-    points = get_points(**kwargs)
-
-    # For artifacts without a Production (i.e., tiles, bricks, etc), use their MaterialType as their Production. If
-    # MaterialType is Tile, use TileType ('Tegula' or 'Imbrex')
-    artifacts["Production"] = artifacts["FabricTypeName"].where(
-        ~artifacts["FabricTypeName"].isnull(),
-        artifacts["MaterialTypeName"].where(
-            artifacts["TileType"].isnull(), artifacts["TileType"]
-        ),
-    )
-
-    artifacts["Production"] = artifacts["Production"].where(
-        ~(
-            (artifacts.Note.str.contains("signinum"))
-            | (artifacts.Note.str.contains("Signinum"))
-        ),
-        "Opus signinum",
-    )
-
-    # summarize artifacts by point
-    art_cts = (
-        artifacts.groupby(["SurveyPointId", "Production"])
-        .agg({"Production": "size", "Weight": "sum"})
-        .unstack()
-    )
-
-    # merge Production (counts) and Weight (weights) with the points df
-    # do this in two steps so that we can append the _ct and _wt suffixes to columns
-    cts = _pd.merge(
-        points,
-        art_cts["Production"],
-        how="left",
-        left_on="SurveyPointId",
-        right_index=True,
-    )
-    cts_wts = _pd.merge(
-        cts,
-        art_cts["Weight"],
-        how="left",
-        left_on="SurveyPointId",
-        right_index=True,
-        suffixes=("_ct", "_wt"),
+    points = get_points_times(warn="disable", **kwargs)
+    artifacts = _assign_production(
+        get_artifacts(sections=["classify", "tile_brick"], **kwargs)
     )
-    return cts_wts
+    if fields_shp_path is not None:
+        from leiap.spatial import find_geo_field, load_fields
 
+        fields = load_fields(fields_shp_path)
 
-#######################################################################################################################
+        def add_geo_field(df, key):
+            # a point on a shared boundary is matched to more than one field
+            geo = find_geo_field(df, fields)[[key, "geo_field"]]
+            return df.merge(geo.drop_duplicates(key), on=key, how="left")
 
+        points = add_geo_field(points, "SurveyPointId")
+        artifacts = add_geo_field(artifacts, "SherdId")
 
-def get_points_times(warn="enable", **kwargs):
-    """Load a DataFrame of points with datetimes cleaned and search times calculated
-    
-    Parameters
-    ----------
-    warn : {'enable', 'disable'}
-        Argument passed to the `calc_search_time()` function specifying whether or to print a generic warning message.
-    **kwargs
-        Optional arguments that are passed to get_credentials()
-    
-    Returns
-    -------
-    pts : pandas DataFrame
-        DataFrame of all points with adjusted datetimes and search times
-    """
-    pts = calc_search_time(clean_datetimes(get_points(**kwargs)), warn=warn)
-    return pts
+    return {
+        "SurveyPointDerived": write_derived(points, "SurveyPointDerived", **kwargs),
+        "SherdDerived": write_derived(artifacts, "SherdDerived", **kwargs),
+    }
 
 
 #######################################################################################################################
@@ -4,6 +4,7 @@ This file contains functions for making maps
 
 
 from .spatial import *
+from .spatial import _field_store
 from .report import *
 
 # import cartopy.crs as _ccrs
@@ -19,8 +20,8 @@ def field_explorer(artifacts, points, fields_shp_path, html_file_out=""):
     Parameters
     ----------
     artifacts, points : pandas DataFrames
-    fields_shp_path : str
-        Path to the shapefile of fields
+    fields_shp_path : str or FieldStore
+        Path to the shapefile of fields, or the fields already loaded with `load_fields()`
     html_file_out : str
         Path to save the output file
     
@@ -48,17 +49,15 @@ def field_explorer(artifacts, points, fields_shp_path, html_file_out=""):
         NumeralTickFormatter,
     )
 
-    geo_artifacts = find_geo_field(
-        artifacts, fields_shp_path
-    )  # find geofield for artifacts
-    geo_points = find_geo_field(points, fields_shp_path)  # find geofield for points
+    fields = _field_store(fields_shp_path)  # load the shapefile only once
+
+    geo_artifacts = find_geo_field(artifacts, fields)  # find geofield for artifacts
+    geo_points = find_geo_field(points, fields)  # find geofield for points
 
     fields_sum = fields_summary_table(
         geo_points, geo_artifacts
     )  # summarize artifacts by geofield
-    fields_shp = read_fields_shp(
-        fields_shp_path
-    )  # get fields shapefile as geodataframe
+    fields_shp = read_fields_shp(fields)  # get fields shapefile as geodataframe
 
     # attach artifact summaries to fields geodataframe
     fields_merge = fields_shp.merge(
@@ -141,8 +140,8 @@ def single_field_map(field, fields_gdf, axis_len=500, save_path=None):
     ----------
     field : str
         Survey field ID for field of interest
-    fields_gdf : geopandas GeoDataFrame
-        geopandas GeoDataFrame of all fields
+    fields_gdf : geopandas GeoDataFrame or FieldStore
+        geopandas GeoDataFrame of all fields, or the fields loaded with `load_fields()`
     axis_len : int, optional
         Length of both x and y axes
     save_path : str, optional
@@ -154,19 +153,22 @@ def single_field_map(field, fields_gdf, axis_len=500, save_path=None):
         Styled map of desired field
 
     """
+    if isinstance(fields_gdf, FieldStore):
+        minx, miny, maxx, maxy = fields_gdf.bounds[field]  # precomputed bounding box
+        fields_gdf = fields_gdf.fields
+    else:
+        # find bounding box of selected field and extract mins and maxs
+        bounds = fields_gdf[fields_gdf["fid"] == field].bounds
+        minx, maxx, miny, maxy = (
+            bounds.minx.iloc[0],
+            bounds.maxx.iloc[0],
+            bounds.miny.iloc[0],
+            bounds.maxy.iloc[0],
+        )
+
     selected = fields_gdf[fields_gdf["fid"] == field]  # isolate desired field as a gdf
     unselected = fields_gdf[fields_gdf["fid"] != field]  # get all other fields as a gdf
 
-    bounds = (
-        selected.bounds
-    )  # find bounding box of selected field and extract mins and maxs
-    minx, maxx, miny, maxy = (
-        bounds.minx.iloc[0],
-        bounds.maxx.iloc[0],
-        bounds.miny.iloc[0],
-        bounds.maxy.iloc[0],
-    )
-
     h_mid = minx + (
         (maxx - minx) / 2
     )  # find horizontal midpoint of selected field's bounding box
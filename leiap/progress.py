@@ -74,7 +74,7 @@ def get_classification_progress(year, bags_col="NumBags"):
 
     """
     points_df = get_points(years=[year])
-    artifacts_df = get_artifacts(years=[year], discards=True)
+    artifacts_df = get_artifacts(years=[year], include_discards=True)
 
     pts_w_bags = points_df[points_df[bags_col] > 0].shape[0]
     pts_classified = artifacts_df.groupby(["SurveyPointId"]).size().shape[0]
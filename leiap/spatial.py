@@ -3,6 +3,7 @@ This file contains functions related to spatial data operations
 """
 
 
+import os as _os
 import pandas as _pd
 import geopandas as _gpd
 from shapely.geometry import Point as _Point
@@ -11,15 +12,173 @@ from shapely.geometry import Point as _Point
 #######################################################################################################################
 
 
-def find_geo_field(df, fields_shp_path):
+class FieldStore:
+    """Survey fields loaded once by `load_fields()`, with a spatial index for lookups
+
+    Attributes
+    ----------
+    fields : geopandas GeoDataFrame
+        Same as `read_fields_shp()`, with the columns 'fid' and 'geometry'
+    tree : shapely STRtree
+        Spatial index of `fields.geometry`, in row order
+    geometries : dict
+        Field polygon for every fid
+    bounds : dict
+        Bounding box (minx, miny, maxx, maxy) for every fid
+    path : str
+        Absolute path of the shapefile the fields were loaded from
+    mtime : float
+        Modification time of the shapefile when it was loaded
+
+    Notes
+    -----
+    Pass the store instead of a shapefile path to the spatial and mapping functions (e.g. `find_geo_field()`,
+    `field_explorer()`) to skip reading and parsing the shapefile again.
+    """
+
+    def __init__(self, fields, path=None, mtime=None):
+        from shapely import STRtree
+
+        self.fields = fields
+        self.tree = STRtree(fields.geometry.values)
+        self.geometries = dict(zip(fields["fid"], fields.geometry))
+        self.bounds = {
+            fid: tuple(box.tolist())
+            for fid, box in zip(fields["fid"], fields.geometry.bounds.values)
+        }
+        self.path = path
+        self.mtime = mtime
+
+    def __repr__(self):
+        return f"<FieldStore: {len(self.fields)} fields from {self.path}>"
+
+
+_field_stores = {}
+
+
+def _field_ids(fields):
+    """Build the field identifier ('fid') from the MASA, PARCELA and SUBPARCE columns"""
+    return (
+        fields["MASA"].str[-2:]
+        + fields["PARCELA"].str[-3:]
+        + fields["SUBPARCE"].str[0:]
+    )
+
+
+def _fields_mtime(path):
+    """Latest modification time of a shapefile and its sidecar files (.dbf, .shx, .prj, ...)"""
+    import glob
+
+    stem = _os.path.splitext(path)[0]
+    return max(_os.path.getmtime(p) for p in glob.glob(stem + ".*") + [path])
+
+
+def load_fields(fields_shp_path, cache=True):
+    """Load the survey fields shapefile once and index it for spatial lookups
+
+    Parameters
+    ----------
+    fields_shp_path : str
+        Path to the shapefile (.shp) containing the fields
+    cache : bool
+        If True, reuse a store that was already built from the same, unchanged shapefile, in memory or on disk
+
+    Returns
+    -------
+    store : FieldStore
+
+    Notes
+    -----
+    Stores are keyed by the absolute path of the shapefile and its modification time, so editing the shapefile
+    invalidates them. The on-disk copy is a GeoParquet file in `leiap.get_cache_dir()` and requires `pyarrow`; only
+    the copy for the current version of each shapefile is kept.
+    """
+    import hashlib
+    from leiap.io import get_cache_dir
+
+    path = _os.path.abspath(fields_shp_path)
+    mtime = _fields_mtime(path)
+    store = _field_stores.get(path)
+    if cache and store is not None and store.mtime == mtime:
+        return store
+
+    path_key = hashlib.sha1(path.encode()).hexdigest()[:16]
+    mtime_key = hashlib.sha1(repr(mtime).encode()).hexdigest()[:8]
+    cache_path = _os.path.join(
+        get_cache_dir(), f"fields-{path_key}-{mtime_key}.parquet"
+    )
+    fields = None
+    if cache:
+        try:
+            fields = _gpd.read_parquet(cache_path)
+        except (FileNotFoundError, OSError, ImportError, ValueError):
+            pass
+    if fields is None:
+        fields = read_fields_shp(path)
+        if cache:
+            _write_fields_cache(cache_path, fields)
+            _remove_stale_fields_cache(cache_path, path_key)
+
+    store = FieldStore(fields, path=path, mtime=mtime)
+    _field_stores[path] = store
+    return store
+
+
+def _write_fields_cache(path, fields):
+    """Atomically write the parsed fields to a GeoParquet file; skipped if `pyarrow` is not installed"""
+    import tempfile
+
+    directory = _os.path.dirname(path)
+    _os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    _os.close(fd)
+    try:
+        fields.to_parquet(tmp_path)
+        _os.replace(tmp_path, path)
+    except (ImportError, PermissionError):
+        _os.remove(tmp_path)
+    except BaseException:
+        _os.remove(tmp_path)
+        raise
+
+
+def _remove_stale_fields_cache(cache_path, path_key):
+    """Delete the on-disk copies of earlier versions of the same shapefile"""
+    import glob
+
+    pattern = _os.path.join(
+        glob.escape(_os.path.dirname(cache_path)), f"fields-{path_key}-*.parquet"
+    )
+    for stale in glob.glob(pattern):
+        if stale != cache_path:
+            try:
+                _os.remove(stale)
+            except OSError:
+                pass
+
+
+def _field_store(fields):
+    """Get a `FieldStore` from a store or a shapefile path"""
+    if isinstance(fields, FieldStore):
+        return fields
+    return load_fields(fields)
+
+
+#######################################################################################################################
+
+
+def find_geo_field(df, fields_shp_path, how="inner"):
     """Find the identifier for the field where the point or artifact lies geographically.
     
     Parameters
     ----------
     df : pandas DataFrame
         Points or Artifacts DataFrame; must contain 'Easting' and 'Northing' columns
-    fields_shp_path : str
-        Path to the shapefile (.shp) containing the fields
+    fields_shp_path : str or FieldStore
+        Path to the shapefile (.shp) containing the fields, or the fields already loaded with `load_fields()`
+    how : str, {'inner', 'left'}
+        With 'inner', only records inside a field are returned. With 'left', every record is returned and the ones
+        outside all fields (or without coordinates) get a missing 'geo_field'.
         
     Returns
     -------
@@ -28,32 +187,38 @@ def find_geo_field(df, fields_shp_path):
         
     Notes
     -----
+    Records with a missing 'Easting' or 'Northing' are never matched to a field. A record on the boundary between
+    two fields is matched to both, so it appears once for each of them.
     """
+    import numpy as np
+    import shapely
 
-    fields = _gpd.read_file(fields_shp_path)  # load all fields
-    fields["fid"] = (
-        fields["MASA"].str[-2:]
-        + fields["PARCELA"].str[-3:]
-        + fields["SUBPARCE"].str[0:]
-    )
-    fields = fields[["fid", "geometry"]]  # get only columns we need
+    if how not in ("inner", "left"):
+        raise ValueError("`how` must be 'inner' or 'left'")
+
+    fields = _field_store(fields_shp_path)  # load all fields
 
-    geometry = [
-        _Point(xy)
-        for xy in zip(
-            df["Easting"].fillna(0),  # make coords into shapely Points
-            df["Northing"].fillna(0),
-        )
-    ]
-    pts_gdf = _gpd.GeoDataFrame(df, geometry=geometry)  # make Points into GeoDataFrame
-    pts_gdf.crs = fields.crs  # make coordinate systems equivalent
-
-    joined_df = _gpd.sjoin(
-        pts_gdf, fields, how="inner", op="intersects"
-    )  # do a spatial join to find the ACTUAL fields that intersect locations
-    joined_df = joined_df.rename(
-        columns={"fid": "geo_field"}
-    )  # returns the geo_field for every record
+    x = df["Easting"].to_numpy(dtype=float)
+    y = df["Northing"].to_numpy(dtype=float)
+    rows = np.flatnonzero(~(np.isnan(x) | np.isnan(y)))  # records with coords
+    points = shapely.points(x[rows], y[rows])  # make coords into shapely Points
+
+    # use the spatial index to find the ACTUAL fields that intersect locations
+    pt_idx, field_idx = fields.tree.query(points, predicate="intersects")
+    order = np.lexsort((field_idx, pt_idx))  # keep the order of the records
+    rows = rows[pt_idx[order]]
+    geo_field = fields.fields["fid"].to_numpy(dtype=object)[field_idx[order]]
+
+    if how == "left":
+        # put the unmatched records back in their place with no geo_field
+        unmatched = np.setdiff1d(np.arange(len(df)), rows)
+        rows = np.concatenate([rows, unmatched])
+        geo_field = np.concatenate([geo_field, [None] * len(unmatched)])
+        order = np.argsort(rows, kind="stable")
+        rows, geo_field = rows[order], geo_field[order]
+
+    joined_df = df.iloc[rows].copy()
+    joined_df["geo_field"] = geo_field  # returns the geo_field for every record
 
     return joined_df
 
@@ -92,13 +257,13 @@ def read_fields_shp(path):
     Notes
     -----
     Not meant to be a generic load function! Designed to work specifically with the file we have been using.
+
+    `path` can also be a `FieldStore`, whose fields are returned without reading the file again.
     """
+    if isinstance(path, FieldStore):
+        return path.fields.copy()
     fields = _gpd.read_file(path)  # load all fields
-    fields["fid"] = (
-        fields["MASA"].str[-2:]
-        + fields["PARCELA"].str[-3:]
-        + fields["SUBPARCE"].str[0:]
-    )
+    fields["fid"] = _field_ids(fields)
     fields = fields[["fid", "geometry"]]  # get only columns we need
     return fields
 
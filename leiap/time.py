@@ -9,7 +9,7 @@ import pandas as _pd
 #######################################################################################################################
 
 
-def clean_datetimes(df, dt_col="DataDate"):
+def clean_datetimes(df, dt_col="DataDate", copy=False):
     """Filter datetimes and correct for timezone issues
     
     Parameters
@@ -18,6 +18,8 @@ def clean_datetimes(df, dt_col="DataDate"):
         DataFrame of point observations
     dt_col : str
         Column name for datetime data
+    copy : bool
+        If True, leave `df` unchanged and return a modified copy. By default `df` itself is modified.
     
     Returns
     -------
@@ -34,6 +36,8 @@ def clean_datetimes(df, dt_col="DataDate"):
     which they are downloaded. Before we realized this, a lot of points were uploaded on machines set to U.S. Pacific
     Time. As a result, some times need to be adjusted by 9 hours.
     """
+    if copy:
+        df = df.copy()
     df["dt_adj"] = df[dt_col].where(df[dt_col].dt.year > 2014)
     df = correct_timezone(df, dt_col)
     return df
@@ -42,7 +46,7 @@ def clean_datetimes(df, dt_col="DataDate"):
 #######################################################################################################################
 
 
-def correct_timezone(df, dt_col="DataDate"):
+def correct_timezone(df, dt_col="DataDate", copy=False):
     """Account for some timezone issues
     
     Parameters
@@ -51,6 +55,8 @@ def correct_timezone(df, dt_col="DataDate"):
         DataFrame of point observations
     dt_col : str
         Column name for datetime data
+    copy : bool
+        If True, leave `df` unchanged and return a modified copy. By default `df` itself is modified.
     
     Returns
     -------
@@ -58,17 +64,43 @@ def correct_timezone(df, dt_col="DataDate"):
         Identical to input DataFrame with datetimes fixed so that they all range from 06:30:00-21:30:00. In reality,
         the latest times are approx 15:00:00
     """
-    df[dt_col] = df[dt_col].where(
-        (df[dt_col].dt.time > _pd.Timestamp("06:30:00").time())
-        & (df[dt_col].dt.time < _pd.Timestamp("21:30:00").time()),
-        df[dt_col] + _pd.DateOffset(hours=9),
+    import numpy as np
+
+    if copy:
+        df = df.copy()
+    dts = df[dt_col]
+    # time of day as integer nanoseconds since midnight (NaT is excluded below)
+    day = _pd.Timedelta(days=1).value
+    time_of_day = dts.to_numpy(dtype="datetime64[ns]").view(np.int64) % day
+    daytime = (
+        (time_of_day > _pd.Timedelta("06:30:00").value)
+        & (time_of_day < _pd.Timedelta("21:30:00").value)
+        & dts.notna().to_numpy()
     )
+    df[dt_col] = dts.where(daytime, dts + _pd.Timedelta(hours=9))
     return df
 
 
 #######################################################################################################################
 
 
+def _track_points(df, dt_col):
+    """Sort the points into field/surveyor tracks and line each one up with the previous point of its track"""
+    # one sort puts every field/surveyor track in time order (missing times last); ties go by SurveyPointId
+    track_cols = ["FieldNumber", "SurveyorName"]
+    pts = df[track_cols + ["SurveyPointId", dt_col, "Easting", "Northing"]].sort_values(
+        track_cols + [dt_col, "SurveyPointId"], kind="mergesort"
+    )
+    # previous point of the same track
+    prev = pts.groupby(track_cols, sort=False, dropna=False)[
+        [dt_col, "Easting", "Northing"]
+    ].shift(1)
+    return pts, prev
+
+
+#######################################################################################################################
+
+
 def calc_search_time(df, dt_col="dt_adj", warn="enable"):
     """Calculate search times in seconds
     
@@ -92,7 +124,7 @@ def calc_search_time(df, dt_col="dt_adj", warn="enable"):
     This is a naive calculation that doesn't discard any times. You will want to filter values further before using in
     any interpretively meaningful way.
     """
-    import math
+    import numpy as np
 
     if warn == "enable":
         import warnings
@@ -102,42 +134,115 @@ def calc_search_time(df, dt_col="dt_adj", warn="enable"):
             "Consider further filtering before using `search_time` in calculations."
         )
 
-    pts_ix = df.set_index(
-        ["FieldNumber", "SurveyorName", "SurveyPointId"]
-    ).sort_index()  # create multi-index df
-    combos = list(
-        set(zip(df["FieldNumber"], df["SurveyorName"]))
-    )  # find all unique combos of field and surveyor
-
-    s = []  # list to store series for each surveyor within each field
-    for i in range(len(combos)):  # loop through field/surveyor pairs
-        field, surveyor = combos[i][0], combos[i][1]
-        # create new df subset for that field and surveyor and sort by datetime
-        df_fs = pts_ix.loc[field, surveyor].sort_values(dt_col)
-
-        df_fs["dist"] = df_fs["dist"] = (
-            (df_fs["Easting"] - df_fs["Easting"].shift(1)) ** 2
-            + (df_fs["Northing"] - df_fs["Northing"].shift(1)) ** 2
-        ).apply(
-            lambda x: math.sqrt(x)
-        )  # calculate distance between consecutive pts
-
-        df_fs["search_time"] = (
-            df_fs[dt_col].diff().dt.total_seconds()
-        )  # calculate differences between consecutive dts
-        s.append(
-            df_fs[["search_time", "dist"]]
-        )  # append the small series to the list of series
-
-    t = _pd.concat(
-        s
-    )  # concatenate all of the series into one long one (should be of length == n points)
+    pts, prev = _track_points(df, dt_col)
+
+    t = _pd.DataFrame(
+        {
+            # difference between consecutive dts
+            "search_time": (pts[dt_col] - prev[dt_col]).dt.total_seconds().to_numpy(),
+            # distance between consecutive pts
+            "dist": np.hypot(
+                pts["Easting"] - prev["Easting"], pts["Northing"] - prev["Northing"]
+            ).to_numpy(),
+        },
+        index=pts["SurveyPointId"],
+    )
     return df.join(t, on="SurveyPointId")  # join the series to the original points df
 
 
 #######################################################################################################################
 
 
+def update_search_time(df, new_df, dt_col="dt_adj"):
+    """Add newly uploaded points to points that already have search times, computing only what has changed
+
+    Parameters
+    ----------
+    df : pandas DataFrame
+        Points returned by `calc_search_time()` (or by an earlier call of this function)
+    new_df : pandas DataFrame
+        New points, with the same columns as `df` apart from 'search_time' and 'dist'; `dt_col` must already be
+        cleaned (see `clean_datetimes()`). Points whose SurveyPointId is already in `df` replace the old rows.
+    dt_col : str
+        Column name for datetime data
+
+    Returns
+    -------
+    df : pandas DataFrame
+        The rows of `df` followed by those of `new_df` (with a new RangeIndex), with 'search_time' and 'dist' as
+        `calc_search_time()` would give for all of them
+
+    Notes
+    -----
+    New points are usually appended to the end of a field/surveyor track. For those tracks, the values of the new
+    points are computed from the last old point of the track alone, and the old points are left as they are. A track
+    is recomputed from scratch only if a new point falls before its last point, the track has points without a time
+    (they are sorted last), or a point of the track was replaced.
+
+    Examples
+    --------
+    >>> pts = calc_search_time(clean_datetimes(get_points()), warn="disable")
+    >>> # ...the next day
+    >>> pts = update_search_time(pts, clean_datetimes(get_points(years=[2019])))
+    """
+    track_cols = ["FieldNumber", "SurveyorName"]
+    order = track_cols + [dt_col, "SurveyPointId"]
+    new_df = new_df.drop(columns=["search_time", "dist"], errors="ignore")
+
+    def tracks(frame):
+        return _pd.MultiIndex.from_frame(frame[track_cols])
+
+    replaced = df["SurveyPointId"].isin(new_df["SurveyPointId"])
+    old = df[~replaced]
+    touched = tracks(old).isin(tracks(new_df))
+
+    # last old point and first new point of every track the new points belong to
+    tails = (
+        old.loc[touched, order]
+        .sort_values(order, kind="mergesort")
+        .groupby(track_cols, sort=False, dropna=False)
+        .tail(1)
+    )
+    heads = (
+        new_df[order]
+        .sort_values(order, kind="mergesort")
+        .groupby(track_cols, sort=False, dropna=False)
+        .head(1)
+    )
+    ends = heads.merge(tails, on=track_cols, suffixes=("", "_last"))
+    t_new, t_last = ends[dt_col], ends[dt_col + "_last"]
+    out_of_order = t_last.isna() | (
+        t_new.notna()
+        & (
+            (t_new < t_last)
+            | ((t_new == t_last) & (ends["SurveyPointId"] < ends["SurveyPointId_last"]))
+        )
+    )
+
+    redo = tracks(_pd.concat([ends[out_of_order], df[replaced]]))
+    old_redo = touched & tracks(old).isin(redo)
+    appended = ~tracks(tails).isin(redo)
+    seeds = tails.loc[appended, "SurveyPointId"]
+
+    # the seeds only supply the previous point of their tracks; their own values do not change
+    to_calc = _pd.concat(
+        [old[old_redo | old["SurveyPointId"].isin(seeds)], new_df], ignore_index=True
+    ).drop(columns=["search_time", "dist"])
+    calculated = calc_search_time(to_calc, dt_col=dt_col, warn="disable")
+    calculated = calculated[~calculated["SurveyPointId"].isin(seeds)]
+    calculated = calculated.set_index("SurveyPointId")[["search_time", "dist"]]
+
+    out = _pd.concat([old, new_df], ignore_index=True)
+    changed = out["SurveyPointId"].isin(calculated.index)
+    out.loc[changed, ["search_time", "dist"]] = calculated.loc[
+        out.loc[changed, "SurveyPointId"]
+    ].to_numpy()
+    return out
+
+
+#######################################################################################################################
+
+
 def filter_times(
     df, t_col="search_time", t_lim=(1, 900), dist_col="dist", dist_lim=(1, 20)
 ):
@@ -174,3 +279,269 @@ def filter_times(
 
 
 #######################################################################################################################
+
+
+def sweep_filter_times(
+    df, t_lims, dist_lims, t_col="search_time", dist_col="dist", stats=False
+):
+    """Count the points `filter_times()` would keep for every combination of time and distance limits
+    
+    Parameters
+    ----------
+    df : pandas DataFrame
+        Dataset of points
+    t_lims : list of tuples
+        Min and max limits (inclusive) for time to try; limits with min > max keep no points, as in `filter_times()`
+    dist_lims : list of tuples
+        Min and max limits (inclusive) for distance to try
+    t_col : str
+        Name of column with time info
+    dist_col : str
+        Name of column with distance info
+    stats : bool
+        If True, also give the mean, standard deviation and total of the times that are kept
+        
+    Returns
+    -------
+    sweep : pandas DataFrame
+        One row for each combination of `t_lims` and `dist_lims` (in that order), with the columns 't_min', 't_max',
+        'dist_min', 'dist_max', 'n' (number of points kept) and 'fraction' (`n` over the number of rows in `df`), and
+        'mean_time', 'std_time' and 'total_time' if `stats` is True
+        
+    Notes
+    -----
+    The points are binned once on a grid whose edges are all of the limits, and the 2D histogram is turned into
+    cumulative sums, so each combination is counted from four cumulative sums instead of by filtering `df` again.
+
+    Examples
+    --------
+    >>> t_lims = [(1, t_max) for t_max in range(60, 1260, 60)]
+    >>> dist_lims = [(1, d_max) for d_max in range(5, 55, 5)]
+    >>> sweep = sweep_filter_times(pts, t_lims, dist_lims)
+    >>> sweep.pivot(index="t_max", columns="dist_max", values="fraction")
+    """
+    import numpy as np
+
+    t_lims, dist_lims = list(t_lims), list(dist_lims)
+    t = df[t_col].to_numpy(dtype=float)
+    dist = df[dist_col].to_numpy(dtype=float)
+    keep = ~np.isnan(t) & ~np.isnan(dist)
+    t, dist = t[keep], dist[keep]
+
+    def edges(lims):
+        # every interval [lo, hi] becomes the half-open [lo, next float after hi)
+        lims = np.asarray(lims, dtype=float).reshape(-1, 2)
+        upper = np.nextafter(lims[:, 1], np.inf)
+        return np.unique(np.concatenate([lims[:, 0], upper]))
+
+    t_edges, dist_edges = edges(t_lims), edges(dist_lims)
+    # bin 0 is below the first edge, bin i is [edges[i - 1], edges[i]), the last bin is above the last edge
+    t_bin = np.searchsorted(t_edges, t, side="right")
+    dist_bin = np.searchsorted(dist_edges, dist, side="right")
+    shape = (len(t_edges) + 1, len(dist_edges) + 1)
+    cells = np.ravel_multi_index((t_bin, dist_bin), shape)
+
+    def cumulative(weights=None):
+        # cum[i, j] = total over the points with t below t_edges[i] and dist below dist_edges[j]
+        hist = np.bincount(cells, weights=weights, minlength=shape[0] * shape[1])
+        cum = np.zeros((shape[0] + 1, shape[1] + 1))
+        cum[1:, 1:] = hist.reshape(shape).cumsum(axis=0).cumsum(axis=1)
+        return cum
+
+    def box(cum, t_lo, t_hi, d_lo, d_hi):
+        return cum[t_hi, d_hi] - cum[t_lo, d_hi] - cum[t_hi, d_lo] + cum[t_lo, d_lo]
+
+    def bounds(edges, lims):
+        # rows/columns of the cumulative sums just below each [lo, hi]; an inverted [lo, hi] is empty
+        ix = []
+        for lo, hi in lims:
+            lo_ix = np.searchsorted(edges, lo) + 1
+            hi_ix = np.searchsorted(edges, np.nextafter(hi, np.inf)) + 1
+            ix.append((lo_ix, max(lo_ix, hi_ix)))
+        return ix
+
+    t_ix, dist_ix = bounds(t_edges, t_lims), bounds(dist_edges, dist_lims)
+
+    counts = cumulative()
+    rows = []
+    for (t_min, t_max), (t_lo, t_hi) in zip(t_lims, t_ix):
+        for (d_min, d_max), (d_lo, d_hi) in zip(dist_lims, dist_ix):
+            rows.append(
+                (t_min, t_max, d_min, d_max, int(box(counts, t_lo, t_hi, d_lo, d_hi)))
+            )
+    sweep = _pd.DataFrame(rows, columns=["t_min", "t_max", "dist_min", "dist_max", "n"])
+    sweep["fraction"] = sweep["n"] / len(df) if len(df) else np.nan
+
+    if stats:
+        sums, squares = cumulative(t), cumulative(t ** 2)
+        total = np.array(
+            [box(sums, *ti, *di) for ti in t_ix for di in dist_ix], dtype=float
+        )
+        total_sq = np.array(
+            [box(squares, *ti, *di) for ti in t_ix for di in dist_ix], dtype=float
+        )
+        n = sweep["n"].to_numpy(dtype=float)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            sweep["mean_time"] = np.where(n > 0, total / n, np.nan)
+            var = (total_sq - total ** 2 / n) / (n - 1)
+            sweep["std_time"] = np.where(n > 1, np.sqrt(np.clip(var, 0, None)), np.nan)
+        sweep["total_time"] = total
+
+    return sweep
+
+
+#######################################################################################################################
+
+
+def label_segments(df, dt_col="dt_adj", session_gap=1800, jump_dist=50, turn_angle=90):
+    """Label every point with the session and transect of its field/surveyor track
+    
+    Parameters
+    ----------
+    df : pandas DataFrame
+        Dataset of points, with 'SurveyPointId', 'FieldNumber', 'SurveyorName', 'Easting' and 'Northing' columns
+    dt_col : str
+        Name of column with (corrected) datetimes
+    session_gap : float
+        A gap of more than this many seconds between consecutive points of a track starts a new session
+    jump_dist : float
+        A jump of more than this many meters between consecutive points of a session starts a new transect
+    turn_angle : float
+        A change of heading of more than this many degrees between consecutive legs of a session starts a new transect
+        
+    Returns
+    -------
+    df : pandas DataFrame
+        Input dataframe with the new columns 'session' and 'transect', ids that are unique over the whole dataframe;
+        points without a datetime get <NA> in both
+        
+    Notes
+    -----
+    The points are sorted into tracks the same way as in `calc_search_time()`. A leg is the step from a point to the
+    next one of its track, and the heading of a leg is only defined if the two points are at different positions, so
+    standing still never counts as a turn. The turn is measured at the point that ends the old transect, so the next
+    point (the first one of the new heading) starts the new transect.
+    """
+    import numpy as np
+
+    pts, prev = _track_points(df, dt_col)
+    pts = pts[pts[dt_col].notna()]
+    prev = prev.loc[pts.index]
+
+    gap = (pts[dt_col] - prev[dt_col]).dt.total_seconds().to_numpy()
+    d_e = (pts["Easting"] - prev["Easting"]).to_numpy()
+    d_n = (pts["Northing"] - prev["Northing"]).to_numpy()
+    dist = np.hypot(d_e, d_n)
+
+    # the first point of a track has no previous point (NaN gap)
+    new_session = ~(gap <= session_gap)
+    jump = dist > jump_dist
+
+    # heading of the leg that ends at each point, and the turn from the leg before it (if that leg is in a transect)
+    heading = np.degrees(np.arctan2(d_n, d_e))
+    heading[dist == 0] = np.nan
+    prev_heading = np.where(new_session | jump, np.nan, heading)
+    prev_heading = np.concatenate([[np.nan], prev_heading[:-1]])
+    turn = np.abs((heading - prev_heading + 180) % 360 - 180)
+
+    new_transect = new_session | jump | (turn > turn_angle)
+
+    labels = _pd.DataFrame(
+        {
+            "session": np.cumsum(new_session),
+            "transect": np.cumsum(new_transect),
+        },
+        index=pts["SurveyPointId"],
+    ).astype("Int64")
+    return df.join(labels, on="SurveyPointId")
+
+
+#######################################################################################################################
+
+
+def segment_tracks(
+    df,
+    dt_col="dt_adj",
+    session_gap=1800,
+    jump_dist=50,
+    turn_angle=90,
+    level="transect",
+):
+    """Split every field/surveyor track into sessions and transects and summarize them
+    
+    Parameters
+    ----------
+    df : pandas DataFrame
+        Dataset of points, with 'SurveyPointId', 'FieldNumber', 'SurveyorName', 'Easting' and 'Northing' columns
+    dt_col : str
+        Name of column with (corrected) datetimes
+    session_gap : float
+        A gap of more than this many seconds between consecutive points of a track starts a new session
+    jump_dist : float
+        A jump of more than this many meters between consecutive points of a session starts a new transect
+    turn_angle : float
+        A change of heading of more than this many degrees between consecutive legs of a session starts a new transect
+    level : str, {'transect', 'session'}
+        Give one row for each transect or one row for each session
+        
+    Returns
+    -------
+    segments : pandas DataFrame
+        One row for each segment, with the columns 'FieldNumber', 'SurveyorName', 'session', 'transect' (only if
+        `level` is 'transect'), 'start', 'end', 'n_points', 'length' (meters walked inside the segment) and
+        'median_pace' (median seconds per meter of the legs inside the segment)
+        
+    Notes
+    -----
+    The segments are the ones given by `label_segments()`. Only legs between two points of the same segment count
+    towards its length and pace, so the gaps, jumps and turns between segments are left out. Legs without any
+    distance have no pace.
+
+    Examples
+    --------
+    >>> pts = leiap.get_points_times()
+    >>> transects = segment_tracks(pts, session_gap=20 * 60, jump_dist=30)
+    >>> transects.groupby("SurveyorName")["median_pace"].median()
+    """
+    import numpy as np
+
+    if level not in ("transect", "session"):
+        raise ValueError("`level` must be 'transect' or 'session'")
+    keys = ["FieldNumber", "SurveyorName", "session"]
+    if level == "transect":
+        keys.append("transect")
+
+    pts = label_segments(
+        df,
+        dt_col=dt_col,
+        session_gap=session_gap,
+        jump_dist=jump_dist,
+        turn_angle=turn_angle,
+    )
+    cols = ["FieldNumber", "SurveyorName", "session", "transect"]
+    pts = pts.loc[pts["session"].notna(), cols + [dt_col, "Easting", "Northing"]]
+    pts = pts.sort_values(cols + [dt_col], kind="mergesort")
+
+    # legs that stay inside a segment
+    prev = pts.groupby(keys, sort=False, dropna=False)[
+        [dt_col, "Easting", "Northing"]
+    ].shift(1)
+    leg_time = (pts[dt_col] - prev[dt_col]).dt.total_seconds()
+    leg_dist = np.hypot(
+        pts["Easting"] - prev["Easting"], pts["Northing"] - prev["Northing"]
+    )
+    pts = pts.assign(
+        leg_dist=leg_dist, leg_pace=(leg_time / leg_dist).where(leg_dist > 0)
+    )
+
+    segments = pts.groupby(keys, sort=False, dropna=False).agg(
+        start=(dt_col, "min"),
+        end=(dt_col, "max"),
+        n_points=(dt_col, "size"),
+        length=("leg_dist", "sum"),
+        median_pace=("leg_pace", "median"),
+    )
+    return segments.reset_index()
+
+
+#######################################################################################################################
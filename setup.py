@@ -118,8 +118,8 @@ setup(
     # For an analysis of "install_requires" vs pip's requirements files see:
     # https://packaging.python.org/en/latest/requirements.html
     install_requires=['pyodbc',
-                      'pandas', 'numpy',
-                      'geopandas',
+                      'pandas', 'numpy', 'scipy',
+                      'geopandas', 'shapely>=2',
                       'matplotlib', 'bokeh', 'altair'],  # Optional
 
     # List additional groups of dependencies here (e.g. development
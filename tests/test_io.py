@@ -107,4 +107,427 @@ def test_load_points_times_columns():
     assert 'search_time' in cols
     assert 'dist' in cols
     
-#######################################################################
\ No newline at end of file
+#######################################################################
+#######################################################################
+# Offline tests against a small local SQLite database
+
+import pytest
+
+
+@pytest.fixture
+def local_db(tmp_path):
+    """Tiny SQLite copy of the project schema, used as the active backend"""
+    path = str(tmp_path / "leiap.sqlite")
+    dt = pd.to_datetime
+    tables = {
+        "Field": pd.DataFrame({"FieldId": [1, 2], "FieldNumber": ["03027", "16092"]}),
+        "Surveyor": pd.DataFrame({"SurveyorId": [1, 2], "SurveyorName": ["Ana", "Biel"]}),
+        "SurveyPoint": pd.DataFrame({
+            "SurveyPointId": [1, 2, 3], "SurveyorId": [1, 1, 2], "FieldId": [1, 1, 2], "PointId": [1, 2, 1],
+            "Northing": [4385000.0, 4385010.0, 4386000.0], "Easting": [530000.0, 530000.0, 531000.0],
+            "DataDate": dt(["2016-06-01 09:00", "2016-06-01 09:05", "2017-06-02 10:00"]),
+            "NumBags": [1, 0, 1], "EnteredDate": dt(["2016-06-01", "2016-06-01", "2017-06-02"]),
+            "SherdCount": [0, 0, 0], "tempFixIDs": [0, 0, 0],
+        }),
+        "FabricType": pd.DataFrame({
+            "FabricTypeId": [1, 2, 3], "FabricTypeName": ["Roman", "Discarded", "Talaiotic pottery"],
+            "Chronology": ["r", None, "t"], "CultureOther": [None] * 3, "RegionOther": [None] * 3,
+            "EnteredDate": dt(["2015-01-01"] * 3), "EarlyChrono": [1, None, -850], "LateChrono": [400, None, -550],
+            "Catalan": ["romana", None, "talaiòtica"],
+        }),
+        "ManufactureMethod": pd.DataFrame({"ManufactureID": [1, 2], "ManufactureName": ["a mano", "a torno"]}),
+        "Sherd": pd.DataFrame({
+            "SherdId": [10, 11, 12], "FieldId": [1, 1, 2], "SurveyorId": [1, 1, 2], "PointId": [1, 1, 1],
+            "SherdNum": [1, 2, 1], "SurveyPointId": [1, 1, 3], "Length": [1.0, 2.0, 3.0],
+            "Width": [1.0, 2.0, 3.0], "Thickness": [0.5, 0.5, 0.5], "Weight": [10.0, 20.0, 30.0],
+            "ChangedDate": dt(["2016-07-01", "2016-07-01", "2017-07-01"]), "ManufactureMethod": [1, 1, 1],
+            "MaterialTypeName": ["Pottery", "Pottery", "Pottery"], "TileType": [None, None, None],
+            "FabricType": [1, 1, 2], "Note": [None, "opus signinum", None], "Form": [None] * 3,
+            "VesselPartOther": [None] * 3, "WareTypeOther": [None] * 3, "TileIsStamped": [0] * 3,
+            "TileIsCurved": [0] * 3, "BrickIsStamped": [0] * 3,
+        }),
+        "WareType": pd.DataFrame({"WareTypeId": [1, 2], "WareTypeName": ["fine ware", "other"]}),
+        "SherdWareType": pd.DataFrame({"SherdId": [10, 10, 11], "WareTypeId": [1, 2, 1]}),
+        "VesselPart": pd.DataFrame({"VesselPartId": [1, 2], "VesselPartName": ["rim", "other"]}),
+        "SherdVesselPart": pd.DataFrame({"SherdId": [10, 11, 11, 12], "VesselPartId": [1, 1, 2, 2]}),
+    }
+    leiap.write_local_db(path, tables)
+    leiap.use_backend("sqlite", path)
+    yield path
+    leiap.use_backend()
+
+
+@pytest.fixture
+def local_cache(local_db, tmp_path):
+    """`local_db` with the cache directory inside the test's temporary directory"""
+    old = leiap.get_cache_dir()
+    leiap.set_cache_dir(str(tmp_path / "cache"))
+    yield local_db
+    leiap.set_cache_dir(old)
+
+
+def test_local_get_points_years(local_db):
+    df = leiap.get_points(years=["2016"])
+    assert df["SurveyPointId"].tolist() == [1, 2]
+    assert "SherdCount" not in df.columns
+
+
+def test_local_get_artifacts_drops_discards(local_db):
+    df = leiap.get_artifacts(sections=["metrics"])
+    assert df["SherdId"].tolist() == [10, 11]
+    assert "FabricTypeName" not in df.columns
+
+
+def test_local_get_artifacts_waretypes(local_db):
+    df = leiap.get_artifacts(sections=["waretypes"], sparse=False)
+    assert df["fine ware"].tolist() == [1, 1]
+    assert df["other_waretype"].tolist() == [1, 0]
+
+
+def test_local_get_artifacts_multi_hot_sparse(local_db):
+    sections = ["waretypes", "vesselparts"]
+    df = leiap.get_artifacts(sections=sections)
+    multi_hot = ["fine ware", "other_waretype", "other_vesselpart", "rim"]
+    assert df.columns[-4:].tolist() == multi_hot
+    for col in multi_hot:
+        assert df[col].dtype == pd.SparseDtype("int64", 0)
+    # the link of discarded sherd 12 is left out
+    assert df["rim"].sparse.to_dense().tolist() == [1, 1]
+    assert df["other_vesselpart"].sparse.to_dense().tolist() == [0, 1]
+    dense = leiap.get_artifacts(sections=sections, sparse=False)
+    pd.testing.assert_frame_equal(df.astype({col: "int64" for col in multi_hot}), dense)
+
+
+def test_local_production_cts_wts_server_side_matches(local_db):
+    client = leiap.get_production_cts_wts()
+    server = leiap.get_production_cts_wts(server_side=True)
+    pd.testing.assert_frame_equal(client, server[client.columns], check_dtype=False)
+
+
+def test_local_load_dataset(local_db):
+    ds = leiap.load_dataset(sections=["metrics", "classify", "production", "tile_brick"])
+    assert ds.points["SurveyPointId"].tolist() == leiap.get_points()["SurveyPointId"].tolist()
+    assert ds.get_artifacts([11, 10])["SherdId"].tolist() == [11, 10]
+    with pytest.raises(KeyError):
+        ds.get_artifacts([10, 999])
+    with pytest.raises(KeyError):
+        ds.get_points([999])
+    pd.testing.assert_frame_equal(
+        leiap.get_production_cts_wts(dataset=ds), leiap.get_production_cts_wts()
+    )
+    with pytest.raises(ValueError):
+        ds.require_sections(["waretypes"])
+
+
+def test_local_load_dataset_with_discards(local_db, capsys):
+    ds = leiap.load_dataset(sections=["metrics", "classify", "production", "tile_brick"], include_discards=True)
+    assert ds.include_discards and len(ds.artifacts) == 3
+    pd.testing.assert_frame_equal(
+        leiap.get_production_cts_wts(dataset=ds), leiap.get_production_cts_wts()
+    )
+    outliers = leiap.check_measurement("Weight", 0.5, dataset=ds)
+    assert outliers["SherdId"].tolist() == leiap.check_measurement("Weight", 0.5)["SherdId"].tolist() == [11, 10]
+    with pytest.raises(ValueError):
+        leiap.load_dataset(sections=["metrics"], include_discards=True).kept_artifacts()
+
+
+def test_local_db_query_memo(local_db):
+    import sqlite3
+
+    with leiap.memoize():
+        first = leiap.db_query("SELECT * FROM Field")
+        first.loc[0, "FieldNumber"] = "changed"
+        with sqlite3.connect(local_db) as conn:
+            conn.execute("INSERT INTO Field VALUES (3, '99999')")
+        memoized = leiap.db_query("SELECT * FROM Field")
+        assert memoized["FieldNumber"].tolist() == ["03027", "16092"]
+        assert len(leiap.db_query("SELECT * FROM Field", memo=False)) == 3
+        leiap.clear_cache()
+        assert len(leiap.db_query("SELECT * FROM Field")) == 3
+    # off outside memoize(), and forgotten when the block exits
+    with sqlite3.connect(local_db) as conn:
+        conn.execute("INSERT INTO Field VALUES (4, '88888')")
+    assert len(leiap.db_query("SELECT * FROM Field")) == 4
+    assert leiap.clear_cache() == 0
+
+
+def test_local_db_query_memo_maxbytes(local_db):
+    try:
+        leiap.configure_memo(maxbytes=1000, enabled=True)
+        leiap.db_query("SELECT * FROM Field")
+        leiap.db_query("SELECT * FROM Sherd")  # too big to keep
+        assert leiap.clear_cache() == 1
+    finally:
+        leiap.configure_memo(maxbytes=512 * 2 ** 20, enabled=False)
+
+
+def test_local_profile(local_db):
+    with leiap.profile() as prof, leiap.memoize():
+        df = leiap.get_points()
+        leiap.get_points()
+    stats = prof.to_frame()
+    assert stats["stage"].tolist() == ["connect", "execute", "fetch", "frame", "loader", "memo", "loader"]
+    assert stats.loc[stats["stage"] == "frame", "rows"].item() == len(df)
+    assert stats["rows"].iloc[-1] == len(df)
+    assert prof.summary().loc["loader", "calls"] == 2
+
+
+def test_local_write_derived(local_db):
+    pts = leiap.get_points_times(warn="disable")
+    assert leiap.write_derived(pts, "SurveyPointDerived", batch_size=2) == 3
+    pts["dist"] = -1.0
+    leiap.write_derived(pts.head(1), "SurveyPointDerived", columns=["dist"])
+    saved = leiap.get_points(derived=True).set_index("SurveyPointId")
+    expected = pts.set_index("SurveyPointId")
+    pd.testing.assert_series_equal(saved["search_time"], expected["search_time"])
+    assert saved["dist"].iloc[0] == -1.0
+    assert saved["dt_adj"].isna().tolist() == expected["dt_adj"].isna().tolist()
+
+
+def test_local_get_artifacts_partitions(local_db):
+    sections = ["metrics", "classify", "waretypes"]
+    whole = leiap.get_artifacts(sections=sections, include_discards=True)
+    parts = leiap.get_artifacts(sections=sections, include_discards=True, partitions=3)
+    pd.testing.assert_frame_equal(
+        parts.sort_values("SherdId", ignore_index=True),
+        whole.sort_values("SherdId", ignore_index=True),
+    )
+
+
+def test_local_query_filters(local_db):
+    query = leiap.LeiapQuery().fields("03027").between("2016-01-01", "2017-01-01")
+    assert query.points()["SurveyPointId"].tolist() == [1, 2]
+    assert query.surveyors("Biel").points().empty
+    assert query.productions("Roman").artifacts()["SherdId"].tolist() == [10, 11]
+    discarded = leiap.LeiapQuery().productions("Discarded")
+    assert discarded.points()["SurveyPointId"].tolist() == [3]
+    assert discarded.artifacts().empty
+
+def test_local_load_cached(local_cache):
+    import sqlite3
+
+    assert leiap.load_cached(leiap.get_points)["Easting"].iloc[0] == 530000.0
+    artifacts = leiap.load_cached(leiap.get_artifacts, sections=["waretypes"], sparse=False)
+    assert artifacts["fine ware"].tolist() == [1, 1]
+    # edits to existing rows and to joined tables
+    with sqlite3.connect(local_cache) as conn:
+        conn.execute("UPDATE SurveyPoint SET Easting = 1.0 WHERE SurveyPointId = 1")
+        conn.execute("DELETE FROM SherdWareType")
+    assert leiap.load_cached(leiap.get_points, check_source=False)["Easting"].iloc[0] == 530000.0
+    assert leiap.load_cached(leiap.get_points)["Easting"].iloc[0] == 1.0
+    artifacts = leiap.load_cached(leiap.get_artifacts, sections=["waretypes"], sparse=False)
+    assert "fine ware" not in artifacts.columns
+    with sqlite3.connect(local_cache) as conn:
+        conn.execute("UPDATE FabricType SET FabricTypeName = 'Discarded' WHERE FabricTypeId = 1")
+    assert leiap.load_cached(leiap.get_artifacts, sections=["waretypes"], sparse=False).empty
+
+
+def test_local_invalidate_cache(local_cache):
+    import glob
+    import os
+
+    leiap.load_cached(leiap.get_points)
+    leiap.load_cached(leiap.get_points, years=[2016])
+    leiap.load_cached("get_productions_simple")
+    leiap.sync_points()
+    assert leiap.invalidate_cache(leiap.get_points) == 2
+    assert leiap.invalidate_cache() == 1
+    assert leiap.invalidate_cache() == 0
+    # the sync store is kept, so the next sync only downloads new rows
+    assert len(glob.glob(os.path.join(leiap.get_cache_dir(), "sync", "sync_points-*.parquet"))) == 1
+
+def test_local_sync(local_cache):
+    import sqlite3
+
+    leiap.sync_points()
+    leiap.sync_artifacts(sections=["waretypes"])
+    with sqlite3.connect(local_cache) as conn:
+        conn.execute("UPDATE SurveyPoint SET Easting = 1.0, EnteredDate = '2018-01-01 00:00:00' WHERE SurveyPointId = 2")
+        conn.execute("INSERT INTO SurveyPoint SELECT 4, SurveyorId, FieldId, 2, Northing, Easting, DataDate, NumBags, "
+                     "'2018-01-01 00:00:00', SherdCount, tempFixIDs FROM SurveyPoint WHERE SurveyPointId = 3")
+        # sherd 10 is the only one of type "other", so that column goes away
+        conn.execute("UPDATE Sherd SET FabricType = 2, ChangedDate = '2018-01-01 00:00:00' WHERE SherdId = 10")
+        conn.execute("INSERT INTO Sherd SELECT 13, FieldId, SurveyorId, PointId, 3, SurveyPointId, Length, Width, "
+                     "Thickness, Weight, '2018-01-01 00:00:00', ManufactureMethod, MaterialTypeName, TileType, "
+                     "FabricType, Note, Form, VesselPartOther, WareTypeOther, TileIsStamped, TileIsCurved, "
+                     "BrickIsStamped FROM Sherd WHERE SherdId = 11")
+        conn.execute("INSERT INTO SherdWareType VALUES (13, 1)")
+    points = leiap.sync_points()
+    artifacts = leiap.sync_artifacts(sections=["waretypes"])
+    pd.testing.assert_frame_equal(points, leiap.get_points(memo=False))
+    pd.testing.assert_frame_equal(artifacts, leiap.get_artifacts(sections=["waretypes"], memo=False))
+    assert artifacts["SherdId"].tolist() == [11, 13]
+
+def test_local_chunks_match_whole(local_db):
+    # a chunk of only NULLs has object dtype, so infer the dtypes again after concatenating
+    query = "SELECT * FROM Sherd ORDER BY SherdId"
+    chunks = leiap.db_query_chunks(query, chunksize=2)
+    pd.testing.assert_frame_equal(pd.concat(chunks).infer_objects(), leiap.db_query(query))
+    sections = ["metrics", "classify", "production", "tile_brick"]
+    chunks = leiap.get_artifacts_chunks(sections=sections, include_discards=True, chunksize=1)
+    whole = leiap.get_artifacts(sections=sections, include_discards=True)
+    pd.testing.assert_frame_equal(pd.concat(chunks).infer_objects(), whole)
+    pd.testing.assert_frame_equal(leiap.get_production_cts_wts(chunksize=1), leiap.get_production_cts_wts())
+    pd.testing.assert_frame_equal(
+        leiap.check_measurement("Weight", 0.5, chunksize=1), leiap.check_measurement("Weight", 0.5)
+    )
+
+def test_local_arrow_fetch(local_db):
+    df = leiap.db_query("SELECT * FROM SurveyPoint", arrow=True)
+    assert isinstance(df["Easting"].dtype, pd.ArrowDtype)
+    assert pd.api.types.is_datetime64_dtype(df["DataDate"])
+    leiap.use_arrow_fetch()
+    try:
+        points = leiap.get_points_times(warn="disable")
+    finally:
+        leiap.use_arrow_fetch(False)
+    assert isinstance(points["FieldNumber"].dtype, pd.ArrowDtype)
+    assert pd.api.types.is_datetime64_dtype(points["DataDate"])
+    expected = leiap.get_points_times(warn="disable")
+    pd.testing.assert_series_equal(points["search_time"], expected["search_time"], check_dtype=False)
+
+class _FakeConnection:
+    """Stands in for a database connection in the pool tests"""
+
+    def __init__(self):
+        self.alive, self.closed = True, False
+
+    def cursor(self):
+        return _FakeCursor(self)
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+
+class _FakeCursor:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def execute(self, query):
+        if not self.conn.alive:
+            raise RuntimeError("connection lost")
+
+    def fetchall(self):
+        return [(1,)]
+
+    def close(self):
+        pass
+
+
+class _FakeBackend:
+    name, path = "fake", None
+
+    def __init__(self):
+        self.opened = []
+
+    def connect(self, **kwargs):
+        self.opened.append(_FakeConnection())
+        return self.opened[-1]
+
+    def reset(self, conn):
+        conn.rollback()
+
+
+@pytest.fixture
+def fake_backend(monkeypatch):
+    backend = _FakeBackend()
+    monkeypatch.setitem(leiap.io._backend, "current", backend)
+    leiap.close_pools()
+    yield backend
+    leiap.configure_pool(size=4, idle_timeout=300)
+
+
+def test_pool_reuses_connections(fake_backend):
+    with leiap.pooled_connection() as first:
+        pass
+    with leiap.pooled_connection() as second:
+        assert second is first
+    with leiap.pooled_connection(credentials_path="other.json") as other:
+        assert other is not first  # each set of credentials has its own pool
+    assert len(fake_backend.opened) == 2
+
+
+def test_pool_replaces_expired_and_dead_connections(fake_backend):
+    leiap.configure_pool(idle_timeout=-1)  # every idle connection has expired
+    with leiap.pooled_connection() as first:
+        pass
+    with leiap.pooled_connection() as second:
+        assert second is not first and first.closed
+    leiap.configure_pool(idle_timeout=300)
+    with leiap.pooled_connection() as third:
+        third.alive = False  # fails the SELECT 1 check when it is checked out again
+    with leiap.pooled_connection() as fourth:
+        assert fourth is not third and third.closed
+
+
+def test_pool_size_limit(fake_backend):
+    import threading
+
+    leiap.configure_pool(size=1)
+    got = []
+    with leiap.pooled_connection() as first:
+        waiter = threading.Thread(target=lambda: got.append(leiap.io._get_pool().acquire()))
+        waiter.start()
+        waiter.join(0.2)
+        assert waiter.is_alive() and not got  # blocked until the connection is returned
+    waiter.join(5)
+    assert got == [first]
+    leiap.io._get_pool().release(got[0])
+    assert len(fake_backend.opened) == 1
+
+
+def test_close_pools_during_checkout(fake_backend):
+    with leiap.pooled_connection() as idle:
+        pass
+    with leiap.pooled_connection() as busy:
+        with leiap.pooled_connection() as other:
+            leiap.close_pools()
+            assert not busy.closed and not other.closed
+        assert other.closed  # closed as soon as it is returned
+    assert busy.closed and busy is idle
+    with leiap.pooled_connection() as fresh:
+        assert fresh not in (busy, other)
+
+def test_local_compact_dtypes(local_db, capsys):
+    df = leiap.get_artifacts(sections=["metrics", "classify", "waretypes"], include_discards=True)
+    df["ParentId"] = [1.0, None, 3.0]  # whole-number float ID with a missing value
+    compact = leiap.compact_dtypes(df)
+    assert compact["MaterialTypeName"].dtype == "category"
+    assert compact["Form"].dtype == df["Form"].dtype  # only NULLs, left alone
+    assert compact["SherdId"].dtype == "int8"
+    assert compact["ParentId"].dtype == "Int8"
+    assert compact["ParentId"].isna().tolist() == [False, True, False]
+    for col in ["Length", "Width", "Thickness", "Weight"]:
+        assert compact[col].dtype == "float32"
+    for col in ["Easting", "Northing"]:
+        assert compact[col].dtype == "float64"
+    assert compact["fine ware"].dtype == df["fine ware"].dtype
+    assert capsys.readouterr().out.startswith("Compact dtypes: ")
+    points = leiap.get_points(compact=True)
+    assert "% smaller)" in capsys.readouterr().out
+    pd.testing.assert_frame_equal(points, leiap.compact_dtypes(leiap.get_points(), verbose=False))
+    assert capsys.readouterr().out == ""
+
+def test_local_check_all(local_db):
+    import sqlite3
+
+    # a Talaiotic sherd marked as wheel-made
+    with sqlite3.connect(local_db) as conn:
+        conn.execute("UPDATE Sherd SET FabricType = 3, ManufactureMethod = 2 WHERE SherdId = 11")
+    checks = leiap.check_all()
+    assert checks["coords"].empty
+    assert checks["handmade"]["ManufactureMethod"].tolist() == [2]
+    assert checks["Weight"].empty
+    ds = leiap.load_dataset(sections=["metrics", "classify"])
+    from_dataset = leiap.check_all(dataset=ds)
+    assert sorted(from_dataset) == sorted(checks)
+    for name in ["coords", "Length", "Width", "Thickness", "Weight"]:
+        assert from_dataset[name].index.tolist() == checks[name].index.tolist()
+    pd.testing.assert_frame_equal(
+        from_dataset["handmade"].reset_index(drop=True), checks["handmade"].reset_index(drop=True)
+    )
+
+#######################################################################
@@ -0,0 +1,78 @@
+#######################################################################
+
+import leiap
+import pandas as pd
+import pytest
+
+#######################################################################
+
+@pytest.fixture
+def fields_shp(tmp_path):
+    """Two 100 m square fields side by side, sharing the edge at Easting 100"""
+    import geopandas as gpd
+    from shapely.geometry import box
+
+    path = str(tmp_path / "fields.shp")
+    gpd.GeoDataFrame({
+        "MASA": ["M01", "M01"], "PARCELA": ["P001", "P002"], "SUBPARCE": ["a", "b"],
+        "geometry": [box(0, 0, 100, 100), box(100, 0, 200, 100)],
+    }, crs="EPSG:32631").to_file(path)
+    old = leiap.get_cache_dir()
+    leiap.set_cache_dir(str(tmp_path / "cache"))
+    yield path
+    leiap.set_cache_dir(old)
+
+def test_load_fields_cache(fields_shp, tmp_path, monkeypatch):
+    import glob
+    import os
+
+    store = leiap.load_fields(fields_shp)
+    assert leiap.load_fields(fields_shp) is store
+    assert store.bounds == {"01001a": (0.0, 0.0, 100.0, 100.0), "01002b": (100.0, 0.0, 200.0, 100.0)}
+    assert leiap.read_fields_shp(store)["fid"].tolist() == ["01001a", "01002b"]
+    # the on-disk copy is read when the one in memory is gone
+    cached = glob.glob(str(tmp_path / "cache" / "fields-*.parquet"))
+    assert len(cached) == 1
+    leiap.spatial._field_stores.clear()
+    with monkeypatch.context() as m:
+        m.setattr(leiap.spatial, "read_fields_shp", None)  # the shapefile is not parsed again
+        from_disk = leiap.load_fields(fields_shp)
+    assert from_disk is not store
+    pd.testing.assert_frame_equal(from_disk.fields, store.fields)
+    # editing a sidecar file invalidates both
+    dbf = fields_shp[:-4] + ".dbf"
+    stat = os.stat(dbf)
+    os.utime(dbf, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    reloaded = leiap.load_fields(fields_shp)
+    assert reloaded is not from_disk and reloaded.mtime > store.mtime
+    # the copy for the old version is replaced, not kept alongside
+    assert glob.glob(str(tmp_path / "cache" / "fields-*.parquet")) != cached
+    assert len(glob.glob(str(tmp_path / "cache" / "fields-*.parquet"))) == 1
+
+def test_find_geo_field(fields_shp):
+    pts = pd.DataFrame({
+        "SurveyPointId": [1, 2, 3, 4, 5, 6],
+        # inside the first field, on the shared edge, outside both, missing coords, (0, 0) corner, inside the second
+        "Easting": [50.0, 100.0, 500.0, None, 0.0, 150.0],
+        "Northing": [50.0, 50.0, 50.0, None, 0.0, 50.0],
+    })
+    store = leiap.load_fields(fields_shp)
+    geo = leiap.find_geo_field(pts, store)
+    assert isinstance(geo, pd.DataFrame)
+    assert geo.columns.tolist() == ["SurveyPointId", "Easting", "Northing", "geo_field"]
+    # the point on the shared edge is in both fields; the one without coords is not put at (0, 0)
+    assert geo["SurveyPointId"].tolist() == [1, 2, 2, 5, 6]
+    assert geo["geo_field"].tolist() == ["01001a", "01001a", "01002b", "01001a", "01002b"]
+    pd.testing.assert_frame_equal(leiap.find_geo_field(pts, fields_shp), geo)
+
+def test_find_geo_field_left(fields_shp):
+    pts = pd.DataFrame({"SherdId": [1, 2, 3], "Easting": [50.0, None, 500.0], "Northing": [50.0, 50.0, 50.0]})
+    geo = leiap.find_geo_field(pts, fields_shp, how="left")
+    assert geo["SherdId"].tolist() == [1, 2, 3]
+    assert geo["geo_field"].iloc[0] == "01001a"
+    assert geo["geo_field"].iloc[1:].isna().all()
+    pd.testing.assert_index_equal(geo.index, pts.index)
+    with pytest.raises(ValueError):
+        leiap.find_geo_field(pts, fields_shp, how="right")
+
+#######################################################################
@@ -26,3 +26,87 @@ def test_clean_datetimes_dt_col_type():
     pass
 
 #######################################################################
+
+def test_calc_search_time_tracks():
+    """Times and distances are taken from the previous point of the same field and surveyor"""
+    pts = pd.DataFrame({
+        "SurveyPointId": [1, 2, 3, 4, 5],
+        "FieldNumber": ["03027", "03027", "03027", "16092", "03027"],
+        "SurveyorName": ["Ana", "Ana", "Biel", "Ana", "Ana"],
+        "Easting": [0.0, 3.0, 0.0, 0.0, 3.0],
+        "Northing": [0.0, 4.0, 0.0, 0.0, 0.0],
+        "dt_adj": pd.to_datetime(["2016-06-01 09:01", "2016-06-01 09:00", "2016-06-01 09:02",
+                                  "2016-06-01 09:03", None]),
+    })
+    df = leiap.calc_search_time(pts, warn="disable")
+    assert df.columns.tolist()[-2:] == ["search_time", "dist"]
+    pd.testing.assert_series_equal(
+        df["search_time"], pd.Series([60.0, None, None, None, None], name="search_time", dtype=float)
+    )
+    pd.testing.assert_series_equal(
+        df["dist"], pd.Series([5.0, None, None, None, 3.0], name="dist", dtype=float)
+    )
+
+def test_update_search_time_matches_full():
+    """Appending to one track and inserting into another gives the same values as starting over"""
+    pts = pd.DataFrame({
+        "SurveyPointId": [1, 2, 3, 4, 5, 6],
+        "FieldNumber": ["03027"] * 6,
+        "SurveyorName": ["Ana", "Ana", "Biel", "Biel", "Ana", "Biel"],
+        "Easting": [0.0, 3.0, 0.0, 1.0, 6.0, 5.0],
+        "Northing": [0.0, 4.0, 0.0, 1.0, 8.0, 5.0],
+        "dt_adj": pd.to_datetime(["2016-06-01 09:00", "2016-06-01 09:01", "2016-06-01 09:00",
+                                  "2016-06-01 09:05", "2016-06-01 09:03", "2016-06-01 09:02"]),
+    })
+    old = leiap.calc_search_time(pts.iloc[:4], warn="disable")
+    updated = leiap.update_search_time(old, pts.iloc[4:])
+    full = leiap.calc_search_time(pts, warn="disable")
+    pd.testing.assert_frame_equal(updated, full)
+
+def test_clean_datetimes_copy():
+    """Times outside 06:30-21:30 are moved 9 hours later, and copy=True leaves the input alone"""
+    pts = pd.DataFrame({"DataDate": pd.to_datetime(["2016-06-01 02:00", "2016-06-01 06:30", "2016-06-01 12:00",
+                                                    "2014-06-01 00:00", None])})
+    df = leiap.clean_datetimes(pts, copy=True)
+    assert "dt_adj" not in pts.columns
+    expected = pd.to_datetime(["2016-06-01 11:00", "2016-06-01 15:30", "2016-06-01 12:00", "2014-06-01 09:00", None])
+    assert df["DataDate"].tolist() == expected.tolist()
+    assert df["dt_adj"].isna().tolist() == [False, False, False, True, True]
+
+def test_sweep_filter_times_matches_filter_times():
+    """Every combination of limits keeps as many points as filter_times() would"""
+    pts = pd.DataFrame({
+        "search_time": [0, 1, 5, 60, 899, 900, 901, None, 30],
+        "dist": [1, 1, 20, 20.5, 3, 20, 5, 5, None],
+    })
+    # (10, 5) and (25, 0) are inverted and keep nothing
+    t_lims, dist_lims = [(1, 900), (1, 60), (0, 10), (10, 5)], [(1, 20), (0, 25), (25, 0)]
+    sweep = leiap.sweep_filter_times(pts, t_lims, dist_lims, stats=True)
+    for row in sweep.itertuples():
+        kept = leiap.filter_times(pts, t_lim=(row.t_min, row.t_max), dist_lim=(row.dist_min, row.dist_max))
+        assert row.n == len(kept)
+        assert row.fraction == len(kept) / len(pts)
+        assert row.total_time == kept["search_time"].sum()
+
+def test_segment_tracks():
+    """Time gaps, distance jumps and turns split a track into sessions and transects"""
+    times = ["09:00", "09:01", "09:02", "09:03", "09:04", "09:05", "10:00", "10:01", "10:02"]
+    pts = pd.DataFrame({
+        "SurveyPointId": range(9), "FieldNumber": 1, "SurveyorName": "A",
+        "dt_adj": pd.to_datetime(["2016-06-01 " + t for t in times]),
+        # north for two legs, turn back south, jump, then a new session after the long gap
+        "Easting": [0, 0, 0, 10, 10, 500, 500, 500, 500],
+        "Northing": [0, 10, 20, 10, 0, 0, 10, 20, 30],
+    })
+    labels = leiap.label_segments(pts, jump_dist=50, turn_angle=60)
+    assert labels["session"].tolist() == [1, 1, 1, 1, 1, 1, 2, 2, 2]
+    assert labels["transect"].tolist() == [1, 1, 1, 2, 2, 3, 4, 4, 4]
+    segments = leiap.segment_tracks(pts, jump_dist=50, turn_angle=60)
+    assert segments["n_points"].tolist() == [3, 2, 1, 3]
+    assert segments["length"].tolist() == [20, 10, 0, 20]
+    assert segments["median_pace"].tolist()[:2] == [6, 6]
+    assert segments["start"].iloc[3] == pd.Timestamp("2016-06-01 10:00")
+    sessions = leiap.segment_tracks(pts, jump_dist=50, turn_angle=60, level="session")
+    assert sessions["n_points"].tolist() == [6, 3]
+
+#######################################################################